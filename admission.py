@@ -0,0 +1,139 @@
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed instead of queued"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f"Inference request rejected: {reason}")
+        self.reason = reason
+        self.retry_after = retry_after
+
+class AdmissionController:
+    """Bounded queue in front of TensorFlow inference.
+
+    At most max_concurrent requests run inference at once, at most
+    max_queue wait behind them, and one user can hold at most
+    per_user_limit slots (running + queued). A request whose estimated
+    wait exceeds the deadline is rejected up front instead of queueing.
+    """
+
+    def __init__(self, max_concurrent=None, max_queue=None, per_user_limit=None, deadline=None):
+        self.max_concurrent = max_concurrent or int(os.environ.get('INFERENCE_MAX_CONCURRENT', 2))
+        self.max_queue = max_queue or int(os.environ.get('INFERENCE_MAX_QUEUE', 16))
+        self.per_user_limit = per_user_limit or int(os.environ.get('INFERENCE_PER_USER_LIMIT', 2))
+        self.deadline = deadline or float(os.environ.get('INFERENCE_DEADLINE_SECONDS', 10))
+
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+        self._per_user = {}
+        # Exponentially weighted average of inference service time (seconds)
+        self._avg_service = 0.5
+
+        self.metrics = {
+            'admitted_total': 0,
+            'rejected_total': {'user_limit': 0, 'queue_full': 0, 'deadline': 0},
+            'queue_wait_seconds_sum': 0.0,
+            'queue_wait_seconds_max': 0.0,
+        }
+
+    def estimated_wait(self):
+        """Seconds a newly arriving request would wait for a slot"""
+        if self._active < self.max_concurrent and self._waiting == 0:
+            return 0.0
+        rounds = math.ceil((self._waiting + 1) / self.max_concurrent)
+        return rounds * self._avg_service
+
+    def _reject(self, reason, wait_estimate):
+        self.metrics['rejected_total'][reason] += 1
+        retry_after = max(1, math.ceil(wait_estimate or self._avg_service))
+        raise AdmissionRejected(reason, retry_after)
+
+    def acquire(self, user_id):
+        """Block until an inference slot is free; returns seconds spent queued"""
+        start = time.monotonic()
+        with self._cond:
+            if self._per_user.get(user_id, 0) >= self.per_user_limit:
+                self._reject('user_limit', self._avg_service)
+
+            estimate = self.estimated_wait()
+            if estimate > 0:
+                if self._waiting >= self.max_queue:
+                    self._reject('queue_full', estimate)
+                if estimate > self.deadline:
+                    self._reject('deadline', estimate)
+
+            self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+            self._waiting += 1
+            try:
+                while self._active >= self.max_concurrent:
+                    remaining = self.deadline - (time.monotonic() - start)
+                    if remaining <= 0:
+                        self._release_user(user_id)
+                        self._reject('deadline', self.estimated_wait())
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+
+            self._active += 1
+            waited = time.monotonic() - start
+            self.metrics['admitted_total'] += 1
+            self.metrics['queue_wait_seconds_sum'] += waited
+            self.metrics['queue_wait_seconds_max'] = max(self.metrics['queue_wait_seconds_max'], waited)
+            return waited
+
+    def _release_user(self, user_id):
+        count = self._per_user.get(user_id, 0) - 1
+        if count > 0:
+            self._per_user[user_id] = count
+        else:
+            self._per_user.pop(user_id, None)
+
+    def release(self, user_id, service_time):
+        with self._cond:
+            self._active -= 1
+            self._release_user(user_id)
+            self._avg_service = 0.8 * self._avg_service + 0.2 * service_time
+            self._cond.notify()
+
+    @contextmanager
+    def slot(self, user_id):
+        """with admission_controller.slot(user_id): run inference"""
+        self.acquire(user_id)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(user_id, time.monotonic() - start)
+
+    def prometheus_metrics(self):
+        """Metrics in Prometheus text exposition format"""
+        with self._cond:
+            lines = [
+                '# TYPE inference_admitted_total counter',
+                f"inference_admitted_total {self.metrics['admitted_total']}",
+                '# TYPE inference_rejected_total counter',
+            ]
+            for reason, count in self.metrics['rejected_total'].items():
+                lines.append(f'inference_rejected_total{{reason="{reason}"}} {count}')
+            lines += [
+                '# TYPE inference_queue_wait_seconds summary',
+                f"inference_queue_wait_seconds_sum {self.metrics['queue_wait_seconds_sum']:.6f}",
+                f"inference_queue_wait_seconds_count {self.metrics['admitted_total']}",
+                '# TYPE inference_queue_wait_seconds_max gauge',
+                f"inference_queue_wait_seconds_max {self.metrics['queue_wait_seconds_max']:.6f}",
+                '# TYPE inference_active gauge',
+                f"inference_active {self._active}",
+                '# TYPE inference_queued gauge',
+                f"inference_queued {self._waiting}",
+                '# TYPE inference_service_seconds_avg gauge',
+                f"inference_service_seconds_avg {self._avg_service:.6f}",
+            ]
+        return "\n".join(lines) + "\n"
+
+# Initialize admission controller
+admission_controller = AdmissionController()
@@ -1,291 +1,108 @@
-from flask import Flask, request, jsonify, render_template, redirect, url_for, session, Response
+from flask import Flask, request, jsonify, render_template, redirect, url_for, session, Response, g
 from flask_cors import CORS
-from model_loader import model_predictor
-import mysql.connector
-from mysql.connector import Error
+from model_loader import model_predictor, MODEL_PIN_CHECK_SECONDS
 import os
-import hashlib
 import time
 from image_utils import image_processor  # CORRECTED IMPORT - from image_utils instead of image_use
+from storage import create_storage
+from heatmap_cache import heatmap_cache
+from admission import admission_controller, AdmissionRejected
+from embedding_index import embedding_index
+from tensor_cache import tensor_cache
+from rescore import rescore_predictions, compare_input_paths
+from jobs import job_manager, JobQueueFull
+from assets import register_assets, asset_manifest
+from page_cache import page_cache
+from memory_monitor import memory_monitor
+from volume_loader import open_volume, predict_volume, slice_to_png, VolumeError
 import base64
 import json
 from datetime import datetime
 import io
 import traceback
+import click
+import zipfile
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from flask import send_file  # Add this import
  # Added import for traceback
 
 app = Flask(__name__)
 app.secret_key = 'alzheimer_secret_key_2024'
 CORS(app)
+register_assets(app)
 
-# Password hashing function
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
-
-# MySQL Database Configuration for XAMPP
-class Database:
-    def __init__(self):
-        self.host = 'localhost'
-        self.user = 'root'
-        self.password = ''  # XAMPP default is empty
-        self.database = 'alzheimer_app'
-    
-    def get_connection(self, retries=3, delay=2):
-        """Create connection with retry logic"""
-        for attempt in range(retries):
-            try:
-                connection = mysql.connector.connect(
-                    host=self.host,
-                    user=self.user,
-                    password=self.password,
-                    database=self.database,
-                    auth_plugin='mysql_native_password',
-                    connection_timeout=30
-                )
-                
-                if connection.is_connected():
-                    print(f"✅ Database connection established (attempt {attempt + 1})")
-                    return connection
-                    
-            except Error as e:
-                print(f"❌ Connection attempt {attempt + 1} failed: {e}")
-                if attempt < retries - 1:
-                    print(f"🔄 Retrying in {delay} seconds...")
-                    time.sleep(delay)
-                else:
-                    print("❌ All connection attempts failed")
-                    return None
-        
-        return None
-    
-    def execute_query(self, query, params=None, fetch=True):
-        """Execute query with proper connection handling"""
-        connection = None
-        cursor = None
-        
-        try:
-            connection = self.get_connection()
-            if not connection:
-                return None
-            
-            # Using prepared=True to handle binary data (BLOB) correctly
-            cursor = connection.cursor(prepared=True, dictionary=True) 
-            cursor.execute(query, params or ())
-            
-            if fetch:
-                result = cursor.fetchall()
-                return result
-            else:
-                connection.commit()
-                return True
-                
-        except Error as e:
-            print(f"❌ Query execution failed: {e}")
-            if connection:
-                connection.rollback()
-            return None
-        finally:
-            if cursor:
-                cursor.close()
-            if connection and connection.is_connected():
-                connection.close()
-    
-    def check_database_exists(self):
-        """Check if database and tables exist"""
-        try:
-            # First check if we can connect to MySQL
-            test_conn = mysql.connector.connect(
-                host=self.host,
-                user=self.user,
-                password=self.password,
-                auth_plugin='mysql_native_password'
-            )
-            test_conn.close()
-            
-            # Now check if our database exists and contains the 'users' table
-            connection = self.get_connection()
-            if not connection:
-                return False
-                
-            cursor = connection.cursor()
-            cursor.execute("""
-                SELECT COUNT(*) FROM information_schema.tables 
-                WHERE table_schema = %s AND table_name = 'users'
-            """, (self.database,))
-            users_table_exists = cursor.fetchone()[0] > 0
-            cursor.close()
-            connection.close()
-            
-            return users_table_exists
-                
-        except Error as e:
-            print(f"❌ Error checking database: {e}")
-            return False
-    
-    def authenticate_user_by_username_or_email(self, username_or_email, password):
-        """Improved authentication with better error handling"""
-        query = "SELECT * FROM users WHERE (username = %s OR email = %s) AND password = %s"
-        params = (username_or_email, username_or_email, hash_password(password))
-        
-        result = self.execute_query(query, params)
-        
-        if result and len(result) > 0:
-            user = result[0]
-            print(f"✅ User {user['username']} authenticated successfully!")
-            return user
-        else:
-            print(f"❌ Authentication failed for {username_or_email}")
-            return None
-    
-    def check_user_exists(self, username, email):
-        """Check if user exists"""
-        query = "SELECT id FROM users WHERE username = %s OR email = %s"
-        params = (username, email)
-        
-        result = self.execute_query(query, params)
-        return result is not None and len(result) > 0
-    
-    def register_user(self, user_data):
-        """Register user with transaction"""
-        query = '''
-            INSERT INTO users (username, email, birth_year, gender, blood_group, address, password, register_date)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        '''
-        params = (
-            user_data['username'],
-            user_data['email'],
-            user_data['birth_year'],
-            user_data['gender'],
-            user_data['blood_group'],
-            user_data['address'],
-            hash_password(user_data['password']),
-            datetime.now()
-        )
-        
-        result = self.execute_query(query, params, fetch=False)
-        if result:
-            print(f"✅ User {user_data['username']} registered successfully!")
-            return True
-        else:
-            print(f"❌ Registration failed for {user_data['username']}")
-            return False
-    
-    def save_prediction(self, user_id, image_file, prediction_result, confidence, prediction_details):
-        """Save prediction to database with image encryption - IMPROVED VERSION"""
+# /predict_batch limits and the pool used to decode uploads in parallel
+BATCH_MAX_IMAGES = int(os.environ.get('BATCH_MAX_IMAGES', 64))
+BATCH_MAX_IMAGE_BYTES = int(os.environ.get('BATCH_MAX_IMAGE_BYTES', 20 * 1024 * 1024))
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tif', '.tiff', '.webp')
+decode_pool = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1), thread_name_prefix='decode')
+
+# Usernames allowed to use the /admin routes. Unset (the default) disables them:
+# /register and /create-admin-user hand out any name, including 'admin'
+ADMIN_USERS = {name.strip() for name in os.environ.get('ADMIN_USERS', '').split(',') if name.strip()}
+
+def is_admin():
+    return session.get('user') in ADMIN_USERS
+
+def shed_response(rejection, what):
+    """503 + Retry-After for a request the admission controller turned away"""
+    print(f"🚦 {what} shed ({rejection.reason}), retry after {rejection.retry_after}s")
+    response = jsonify({"error": "Server is busy, please retry shortly", "reason": rejection.reason})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(rejection.retry_after)
+    return response
+
+# Initialize database (STORAGE_BACKEND=mysql|sqlite)
+db = create_storage()
+
+# Hot-path routes whose memory use is sampled, and which a draining worker sheds
+MEMORY_TRACKED_ENDPOINTS = {'predict', 'predict_volume_route', 'predict_batch', 'submit_prediction_job'}
+memory_monitor.add_drain_check(lambda: job_manager.pending())
+
+@app.before_request
+def follow_model_pin():
+    # Picks up versions pinned through /admin/model/reload on any worker
+    model_predictor.check_pin()
+
+@app.before_request
+def begin_memory_tracking():
+    if request.endpoint in MEMORY_TRACKED_ENDPOINTS:
         try:
-            print("💾 Starting prediction save process...")
-            
-            # Reset file pointer before reading
-            image_file.seek(0)
-            
-            # Read original image data
-            original_image_data = image_file.read()
-            print(f"📄 Original file size: {len(original_image_data)} bytes")
-            
-            # Reset again for compression
-            image_file.seek(0)
-            
-            # Compress image
-            compressed_image = image_processor.compress_image(io.BytesIO(original_image_data))
-            
-            if not compressed_image:
-                print("❌ No compressed image data")
-                compressed_image = original_image_data
-            
-            print(f"📦 Final compressed size: {len(compressed_image)} bytes")
-            
-            timestamp = int(time.time())
-            filename =f"prediction_{timestamp}_{user_id}.jpg"
-            saved_filename = image_processor.save_image_file(compressed_image,filename)
-            # Generate encryption key and encrypt
-            encryption_key = image_processor.generate_key()
-            encrypted_image = image_processor.encrypt_image(compressed_image, encryption_key)
-            
-            # Generate hash
-            image_hash = image_processor.generate_hash(compressed_image)
-            
-            # Save to file system for easy access
-            filename = f"prediction_{int(time.time())}_{user_id}.jpg"
-            filepath = image_processor.save_image_file(compressed_image, filename)
-            
-            if not filepath:
-                print("❌ Failed to save image file, using fallback filename")
-                filename = f"prediction_{int(time.time())}_{user_id}.jpg"
-            
-            # Check database connection first
-            if not self.get_connection():
-                print("❌ Database not available, saving to file system only")
-                return True  # Return success for file system save
-            
-            query = '''
-                INSERT INTO predictions (user_id, image_path, prediction_result, confidence, 
-                                         image_data, image_hash, encryption_key, prediction_date)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            '''
-            
-            # Store as JSON string
-            result_with_details = json.dumps({
-                "prediction": prediction_result,
-                "confidence": confidence,
-                "details": prediction_details
-            })
-            
-            params = (
-                user_id,
-                filename,
-                result_with_details,
-                float(confidence),
-                encrypted_image,
-                image_hash,
-                encryption_key.decode(),
-                datetime.now()
-            )
-            
-            result = self.execute_query(query, params, fetch=False)
-            if result:
-                print(f"✅ Prediction saved for user {user_id}")
-                return True
-            else:
-                print(f"❌ Error saving prediction for user {user_id}")
-                return False
-                
-        except Exception as e:
-            print(f"❌ Error in save_prediction: {e}")
-            traceback.print_exc()
-            
-            # Fallback: try to save just the file
-            try:
-                image_file.seek(0)
-                original_data = image_file.read()
-                filename = f"prediction_fallback_{int(time.time())}_{user_id}.jpg"
-                image_processor.save_image_file(original_data, filename)
-                print("✅ Saved image file as fallback")
-                return True
-            except Exception as fallback_error:
-                print(f"❌ Fallback save failed: {fallback_error}")
-                return False
-    
-    def get_user_predictions(self, user_id):
-        """Get user predictions"""
-        query = "SELECT * FROM predictions WHERE user_id = %s ORDER BY prediction_date DESC"
-        result = self.execute_query(query, (user_id,))
-        
-        if result:
-            for prediction in result:
-                try:
-                    result_data = json.loads(prediction['prediction_result'])
-                    prediction['parsed_result'] = result_data
-                except:
-                    prediction['parsed_result'] = {
-                        'prediction': prediction['prediction_result'],
-                        'confidence': prediction['confidence']
-                    }
-        
-        return result or []
+            g.memory_token = memory_monitor.begin(request.endpoint)
+        except AdmissionRejected as e:
+            return shed_response(e, "Request")
+
+@app.teardown_request
+def end_memory_tracking(exc):
+    token = g.pop('memory_token', None)
+    if token:
+        memory_monitor.end(token)
+
+def history_page(page, render, *extra):
+    """Serve a per-user history page with ETag / 304 support.
 
-# Initialize database
-db = Database()
+    The ETag is derived from the user's history_version (bumped by every
+    saved or re-scored prediction), so an unchanged history costs one
+    counter lookup: a 304 when the browser has the page, otherwise the
+    cached render. *extra covers anything else the page shows."""
+    user_id = session.get('user_id')
+    version = db.get_history_version(user_id)
+    if version is None:
+        return render()  # Counter unavailable: render without caching
+
+    etag = page_cache.etag(page, user_id, version, asset_manifest.build_id(), *extra)
+    if request.if_none_match.contains_weak(etag):
+        page_cache.record_not_modified()
+        response = Response(status=304)
+    else:
+        response = Response(page_cache.get_or_render(page, user_id, etag, render), mimetype='text/html')
+    response.set_etag(etag, weak=True)
+    # Pages are per-user: browsers may keep them but must revalidate each visit
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+    return response
 
 # Routes
 @app.route('/')
@@ -418,12 +235,18 @@ def dashboard():
         'login_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     }
     
-    user_predictions = db.get_user_predictions(session.get('user_id'))
-    
-    return render_template('dashboard.html', 
-                          user=user_data,
-                          predictions=user_predictions[:6],
-                          current_time=datetime.now().strftime('%A, %B %d, %Y %I:%M %p'))
+    current_time = datetime.now().strftime('%A, %B %d, %Y %I:%M %p')
+
+    def render():
+        user_predictions = db.get_user_predictions(session.get('user_id'))
+        return render_template('dashboard.html',
+                              user=user_data,
+                              predictions=user_predictions[:6],
+                              current_time=current_time)
+
+    # login_time isn't shown on the page, so it stays out of the ETag
+    shown_user = {key: value for key, value in user_data.items() if key != 'login_time'}
+    return history_page('dashboard', render, current_time, json.dumps(shown_user, sort_keys=True))
 
 @app.route('/logout')
 def logout():
@@ -437,8 +260,11 @@ def results_history():
     if 'user' not in session:
         return redirect(url_for('login_page'))
     
-    user_predictions = db.get_user_predictions(session.get('user_id'))
-    return render_template('results-history.html', predictions=user_predictions)
+    def render():
+        user_predictions = db.get_user_predictions(session.get('user_id'))
+        return render_template('results-history.html', predictions=user_predictions)
+
+    return history_page('results', render)
 
 @app.route('/settings')
 def settings():
@@ -448,6 +274,30 @@ def settings():
     user_data = session.get('user_data', {})
     return render_template('settings.html', user=user_data)
 
+def store_prediction(user_id, image_file, result, embedding=None, input_tensor=None):
+    """Persist a prediction plus its embedding and cached model input"""
+    prediction_id, image_hash = db.save_prediction(
+        user_id=user_id,
+        image_file=image_file,
+        prediction_result=result["prediction"],
+        confidence=result["confidence"],
+        prediction_details=result["all_predictions"],
+        model_version=result.get("model_version")
+    )
+
+    if prediction_id and embedding is not None:
+        embedding_index.add(prediction_id, user_id, embedding, result.get("model_version"))
+
+    # Keep the preprocessed input so a future model can re-score without decrypt/decode
+    if prediction_id and image_hash and input_tensor is not None:
+        try:
+            tensor_cache.put(image_hash, input_tensor)
+        except Exception as e:
+            # The prediction is saved; re-score falls back to decoding the blob
+            print(f"⚠️ Tensor cache write failed for prediction {prediction_id}: {e}")
+
+    return prediction_id
+
 @app.route('/predict', methods=['POST'])
 def predict():
     try:
@@ -479,34 +329,308 @@ def predict():
         
         # Rewind file pointer before passing to prediction function
         image_file.seek(0) 
-        result = model_predictor.predict(image_file)
+        with admission_controller.slot(session.get('user_id')):
+            result = model_predictor.predict(image_file)
+        embedding = result.pop("embedding", None)
+        input_tensor = result.pop("input_tensor", None)
         print(f"✅ Prediction result: {result}")
 
         # Rewind file pointer again before saving (as prediction may have read it)
         image_file.seek(0)
         
         # Save prediction with image
-        db.save_prediction(
-            user_id=session.get('user_id'),
-            image_file=image_file,
-            prediction_result=result["prediction"],
-            confidence=result["confidence"],
-            prediction_details=result["all_predictions"]
-        )
+        prediction_id = store_prediction(session.get('user_id'), image_file, result, embedding, input_tensor)
 
         return jsonify({
             "success": True,
+            "prediction_id": prediction_id,
             "prediction": result["prediction"],
             "confidence": round(result["confidence"], 4),
             "all_predictions": result["all_predictions"],
+            "model_version": result.get("model_version"),
             "message": "Prediction completed successfully!"
         })
 
+    except AdmissionRejected as e:
+        return shed_response(e, "Prediction")
+
     except Exception as e:
         print(f"❌ Error in /predict route: {e}")
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
+@app.route('/predict_volume', methods=['POST'])
+def predict_volume_route():
+    """Predict from a whole MRI volume: NIfTI (.nii/.nii.gz) or a zipped DICOM series"""
+    try:
+        if 'user_id' not in session:
+            return jsonify({"error": "Please login to use prediction feature"}), 401
+
+        if 'volume' not in request.files or request.files['volume'].filename == '':
+            return jsonify({"error": "No volume file provided"}), 400
+
+        upload = request.files['volume']
+        print(f"🧠 Processing volume: {upload.filename} for user: {session.get('user')}")
+
+        if model_predictor.model is None:
+            model_predictor.load_model()
+
+        max_slices = max(1, min(request.form.get('max_slices', 32, type=int), 128))
+        with open_volume(upload) as volume:
+            with admission_controller.slot(session.get('user_id')):
+                result, representative_slice = predict_volume(model_predictor, volume, max_slices=max_slices)
+
+        print(f"✅ Volume prediction: {result['prediction']} ({result['confidence']:.2f}) "
+              f"from {result['volume']['slices_scored']}/{result['volume']['total_slices']} slices")
+
+        # The most confident slice stands in for the volume in history views
+        prediction_id, _ = db.save_prediction(
+            user_id=session.get('user_id'),
+            image_file=slice_to_png(representative_slice),
+            prediction_result=result["prediction"],
+            confidence=result["confidence"],
+            prediction_details=result["all_predictions"],
+            model_version=result.get("model_version"),
+            source='volume'
+        )
+
+        return jsonify({
+            "success": True,
+            "prediction_id": prediction_id,
+            **result,
+            "message": "Volume prediction completed successfully!"
+        })
+
+    except VolumeError as e:
+        return jsonify({"error": str(e)}), 400
+
+    except AdmissionRejected as e:
+        return shed_response(e, "Volume prediction")
+
+    except Exception as e:
+        print(f"❌ Error in /predict_volume route: {e}")
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+def collect_batch_uploads():
+    """(filename, bytes or None, error or None) for every image in the
+    request: multipart 'images' fields and/or a zip under 'archive'"""
+    items = []
+    too_large = f"Image is larger than {BATCH_MAX_IMAGE_BYTES // 2**20} MB"
+    for upload in request.files.getlist('images'):
+        if not upload.mimetype.startswith('image/'):
+            items.append((upload.filename, None, "Invalid file type. Please upload an image."))
+            continue
+        data = upload.read(BATCH_MAX_IMAGE_BYTES + 1)
+        if len(data) > BATCH_MAX_IMAGE_BYTES:
+            items.append((upload.filename, None, too_large))
+        else:
+            items.append((upload.filename, data, None))
+
+    archive = request.files.get('archive')
+    if archive and archive.filename:
+        try:
+            with zipfile.ZipFile(archive.stream) as zf:
+                for member in sorted(zf.infolist(), key=lambda m: m.filename):
+                    if len(items) > BATCH_MAX_IMAGES:
+                        break  # rejected by the caller; don't inflate the rest
+                    if member.is_dir() or member.filename.startswith('__MACOSX/'):
+                        continue
+                    if not member.filename.lower().endswith(IMAGE_EXTENSIONS):
+                        items.append((member.filename, None, "Not an image file"))
+                        continue
+                    if member.file_size > BATCH_MAX_IMAGE_BYTES:
+                        items.append((member.filename, None, f"{too_large} uncompressed"))
+                        continue
+                    # The declared size can lie: never inflate more than the limit
+                    with zf.open(member) as f:
+                        data = f.read(BATCH_MAX_IMAGE_BYTES + 1)
+                    if len(data) > BATCH_MAX_IMAGE_BYTES:
+                        items.append((member.filename, None, f"{too_large} uncompressed"))
+                    else:
+                        items.append((member.filename, data, None))
+        except zipfile.BadZipFile:
+            items.append((archive.filename, None, "Archive is not a valid zip file"))
+    return items
+
+@app.route('/predict_batch', methods=['POST'])
+def predict_batch():
+    """Predict many images in one request and one model batch.
+    Results come back in input order, with per-item errors."""
+    try:
+        if 'user_id' not in session:
+            return jsonify({"error": "Please login to use prediction feature"}), 401
+
+        # Count the parts before reading any of them
+        if len(request.files.getlist('images')) > BATCH_MAX_IMAGES:
+            return jsonify({"error": f"Too many images (max {BATCH_MAX_IMAGES} per request)"}), 400
+
+        items = collect_batch_uploads()
+        if not items:
+            return jsonify({"error": "No images provided"}), 400
+        if len(items) > BATCH_MAX_IMAGES:
+            return jsonify({"error": f"Too many images (max {BATCH_MAX_IMAGES} per request)"}), 400
+
+        print(f"📸 Processing batch of {len(items)} images for user: {session.get('user')}")
+
+        if model_predictor.model is None:
+            model_predictor.load_model()
+
+        def decode(item):
+            filename, data, error = item
+            if error:
+                return None, error
+            try:
+                return model_predictor.load_tensor(io.BytesIO(data)), None
+            except Exception as e:
+                return None, f"Could not decode image: {e}"
+
+        decoded = list(decode_pool.map(decode, items))
+        valid = [i for i, (tensor, _) in enumerate(decoded) if tensor is not None]
+
+        results, embeddings = [], None
+        if valid:
+            tensors = np.stack([decoded[i][0] for i in valid])
+            with admission_controller.slot(session.get('user_id')):
+                results, embeddings, version = model_predictor.predict_tensors(tensors)
+
+        saved = db.save_predictions(
+            session.get('user_id'),
+            [(items[i][1], result) for i, result in zip(valid, results)],
+            model_version=results[0]["model_version"] if results else None,
+            executor=decode_pool
+        ) if valid else []
+
+        if saved is None:
+            # One transaction for the whole batch: nothing was stored
+            print(f"❌ Batch of {len(valid)} predictions could not be saved")
+            return jsonify({"error": "Predictions could not be saved, please retry"}), 500
+
+        if saved:
+            embedding_index.add_many([pid for pid, _ in saved], [session.get('user_id')] * len(saved),
+                                     embeddings, version)
+            try:
+                for (_, image_hash), i in zip(saved, valid):
+                    tensor_cache.put(image_hash, decoded[i][0])
+            except Exception as e:
+                # The predictions are saved; re-score falls back to decoding the blobs
+                print(f"⚠️ Tensor cache write failed for batch: {e}")
+
+        responses = [
+            {"index": i, "filename": filename, "success": False, "error": decoded[i][1]}
+            for i, (filename, _, _) in enumerate(items)
+        ]
+        for n, (i, result) in enumerate(zip(valid, results)):
+            responses[i] = {
+                "index": i,
+                "filename": items[i][0],
+                "success": True,
+                "prediction_id": saved[n][0],
+                "prediction": result["prediction"],
+                "confidence": result["confidence"],
+                "all_predictions": result["all_predictions"],
+                "model_version": result["model_version"],
+            }
+
+        print(f"✅ Batch done: {len(valid)}/{len(items)} images predicted")
+        return jsonify({
+            "success": True,
+            "count": len(items),
+            "succeeded": len(valid),
+            "results": responses,
+            "message": "Batch prediction completed!"
+        })
+
+    except AdmissionRejected as e:
+        return shed_response(e, "Batch prediction")
+
+    except Exception as e:
+        print(f"❌ Error in /predict_batch route: {e}")
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+def run_prediction_job(progress, user_id, image_data, retries=5):
+    """Background version of /predict, reporting each stage as it completes"""
+    with memory_monitor.track('job', admit=False):
+        if model_predictor.model is None:
+            model_predictor.load_model()
+
+        tensor = model_predictor.load_tensor(io.BytesIO(image_data))
+        progress('decoded')
+
+        # Jobs are already queued, so wait out a busy inference pool instead of failing
+        for attempt in range(retries):
+            try:
+                with admission_controller.slot(user_id):
+                    results, embeddings, _ = model_predictor.predict_tensors(tensor[np.newaxis])
+                break
+            except AdmissionRejected as e:
+                if attempt == retries - 1:
+                    raise
+                progress('waiting', reason=e.reason, retry_after=e.retry_after)
+                time.sleep(e.retry_after)
+
+        result = results[0]
+        progress('inferred', prediction=result["prediction"], confidence=result["confidence"])
+
+        prediction_id = store_prediction(user_id, io.BytesIO(image_data), result, embeddings[0], tensor)
+        progress('stored', prediction_id=prediction_id)
+
+        return {"prediction_id": prediction_id, **result}
+
+@app.route('/jobs/predict', methods=['POST'])
+def submit_prediction_job():
+    """Queue a prediction and return its job id immediately"""
+    if 'user_id' not in session:
+        return jsonify({"error": "Please login to use prediction feature"}), 401
+
+    image_file = request.files.get('image')
+    if image_file is None or image_file.filename == '':
+        return jsonify({"error": "No image file provided"}), 400
+    if not image_file.mimetype.startswith('image/'):
+        return jsonify({"error": "Invalid file type. Please upload an image."}), 400
+
+    try:
+        job = job_manager.submit(session['user_id'], 'predict', run_prediction_job,
+                                 session['user_id'], image_file.read())
+    except JobQueueFull:
+        response = jsonify({"error": "Too many queued jobs, please retry shortly"})
+        response.status_code = 503
+        response.headers['Retry-After'] = '5'
+        return response
+
+    print(f"📥 Queued prediction job {job.id} for user: {session.get('user')}")
+    return jsonify({
+        "success": True,
+        "job_id": job.id,
+        "status_url": url_for('get_job', job_id=job.id),
+        "events_url": url_for('job_events', job_id=job.id)
+    }), 202
+
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    """Poll a job's state, stage history and result"""
+    if 'user_id' not in session:
+        return jsonify({"error": "Please login"}), 401
+    job = job_manager.get(job_id, session['user_id'])
+    if job is None:
+        return jsonify({"error": "Job not found or expired"}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """Server-Sent Events stream of a job's progress"""
+    if 'user_id' not in session:
+        return jsonify({"error": "Please login"}), 401
+    job = job_manager.get(job_id, session['user_id'])
+    if job is None:
+        return jsonify({"error": "Job not found or expired"}), 404
+
+    response = Response(job_manager.stream(job), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # don't let nginx buffer the stream
+    return response
+
 # New Image Handling Routes
 @app.route('/get_image/<int:prediction_id>')
 def get_image(prediction_id):
@@ -518,11 +642,9 @@ def get_image(prediction_id):
         print(f"🔍 Looking for image for prediction {prediction_id}")
         
         # First, try to get prediction record from database
-        query = "SELECT * FROM predictions WHERE id = %s AND user_id = %s"
-        result = db.execute_query(query, (prediction_id, session['user_id']))
+        prediction = db.get_prediction(prediction_id, session['user_id'])
         
-        if result:
-            prediction = result[0]
+        if prediction:
             print(f"📊 Found prediction record: {prediction.get('image_path')}")
             
             # Try 1: Get from file system using image_path from database
@@ -532,20 +654,11 @@ def get_image(prediction_id):
                     print(f"✅ Serving from filesystem: {prediction['image_path']}")
                     return redirect(f"/static/uploads/{prediction['image_path']}")
             
-            # Try 2: Get encrypted data from database
-            if prediction.get('image_data') and prediction.get('encryption_key'):
-                try:
-                    encrypted_data = prediction['image_data']
-                    key = prediction['encryption_key'].encode()
-                    
-                    # Decrypt image
-                    decrypted_data = image_processor.decrypt_image(encrypted_data, key)
-                    
-                    if decrypted_data and len(decrypted_data) > 0:
-                        print(f"✅ Serving from database encryption")
-                        return Response(decrypted_data, mimetype='image/jpeg')
-                except Exception as decrypt_error:
-                    print(f"❌ Decryption failed: {decrypt_error}")
+            # Try 2: Get encrypted data from the blob table
+            decrypted_data = db.get_image_blob(prediction_id)
+            if decrypted_data and len(decrypted_data) > 0:
+                print(f"✅ Serving from database encryption")
+                return Response(decrypted_data, mimetype='image/jpeg')
         
         # Try 3: Search filesystem by prediction ID pattern
         print("🔍 Searching filesystem by prediction ID...")
@@ -577,6 +690,115 @@ def get_image(prediction_id):
     except Exception as e:
         print(f"❌ Error retrieving image: {e}")
         return "Error retrieving image", 500
+
+@app.route('/gradcam/<int:prediction_id>')
+def gradcam(prediction_id):
+    """Grad-CAM overlay for a stored prediction, computed on first request
+    and served from the disk cache afterwards"""
+    if 'user_id' not in session:
+        return "Unauthorized", 401
+
+    try:
+        prediction, image_data = db.get_prediction_image(prediction_id, session['user_id'])
+        if not image_data:
+            return "Image not found", 404
+
+        if model_predictor.model is None:
+            model_predictor.load_model()
+
+        # One snapshot for both the cache key and the computation, so a hot swap
+        # in between can't file one model's heatmap under another's version
+        active = model_predictor.active()
+        version = active[1]
+        image_hash = prediction.get('image_hash') or image_processor.generate_hash(image_data)
+        cache_key = heatmap_cache.make_key(image_hash, version)
+
+        def compute():
+            heatmap, _, _ = model_predictor.grad_cam(io.BytesIO(image_data), active=active)
+            return image_processor.overlay_heatmap(image_data, heatmap)
+
+        png_data, cached, elapsed_ms = heatmap_cache.get_or_compute(cache_key, compute)
+        print(f"🔥 Grad-CAM for prediction {prediction_id}: {'cached' if cached else 'cold'} in {elapsed_ms:.1f} ms")
+
+        response = Response(png_data, mimetype='image/png')
+        response.headers['X-Heatmap-Cache'] = 'hit' if cached else 'miss'
+        response.headers['X-Heatmap-Time-Ms'] = f"{elapsed_ms:.1f}"
+        response.headers['X-Model-Version'] = str(version)
+        response.headers['Cache-Control'] = 'private, max-age=3600'
+        return response
+
+    except Exception as e:
+        print(f"❌ Error generating Grad-CAM: {e}")
+        traceback.print_exc()
+        return "Error generating heatmap", 500
+
+@app.route('/admin/gradcam/stats')
+def gradcam_stats():
+    """Cold vs cached Grad-CAM latency"""
+    if not is_admin():
+        return jsonify({"error": "Admin access required"}), 403
+    return jsonify(heatmap_cache.summary())
+
+@app.route('/admin/page_cache/stats')
+def page_cache_stats():
+    """History/dashboard render cache and 304 counts"""
+    if not is_admin():
+        return jsonify({"error": "Admin access required"}), 403
+    return jsonify(page_cache.summary())
+
+@app.route('/similar/<int:prediction_id>')
+def similar_scans(prediction_id):
+    """Prior scans most similar to this one (cosine similarity of embeddings).
+    ?k= sets the result count; admins may pass ?scope=all to search the whole clinic."""
+    if 'user_id' not in session:
+        return jsonify({"error": "Please login to search similar scans"}), 401
+
+    try:
+        if not db.get_prediction(prediction_id, session['user_id']):
+            return jsonify({"error": "Prediction not found"}), 404
+
+        # Embeddings from different models aren't comparable: search the active model's only
+        version = model_predictor.version
+        query = embedding_index.get(prediction_id, version)
+        if query is None:
+            return jsonify({"error": f"No embedding stored for this prediction under model {version}"}), 404
+
+        k = max(1, min(request.args.get('k', 10, type=int), 100))
+        owner_id = None if (request.args.get('scope') == 'all' and is_admin()) else session['user_id']
+
+        start = time.perf_counter()
+        matches = embedding_index.search(query, version, k=k, owner_id=owner_id, exclude_id=prediction_id)
+        search_ms = (time.perf_counter() - start) * 1000
+
+        rows = db.get_predictions_by_ids([match_id for match_id, _ in matches])
+        results = []
+        for match_id, score in matches:
+            row = rows.get(match_id)
+            if not row:
+                continue
+            results.append({
+                "prediction_id": match_id,
+                "similarity": round(score, 4),
+                "prediction": row['parsed_result'].get('prediction'),
+                "confidence": row['parsed_result'].get('confidence'),
+                "prediction_date": row['prediction_date'].isoformat() if row.get('prediction_date') else None,
+                "image_url": f"/get_image/{match_id}" if owner_id is not None else None,
+            })
+
+        return jsonify({
+            "success": True,
+            "prediction_id": prediction_id,
+            "results": results,
+            "model_version": version,
+            "indexed_vectors": embedding_index.count(version),
+            "search_ms": round(search_ms, 2)
+        })
+
+    except Exception as e:
+        print(f"❌ Error in /similar route: {e}")
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/static/uploads/<path:filename>')
 def serve_uploads(filename):
     """Serve uploaded files with proper caching"""
@@ -597,18 +819,13 @@ def get_encrypted_image(prediction_id):
         return "Unauthorized", 401
     
     try:
-        query = "SELECT image_data, encryption_key FROM predictions WHERE id = %s AND user_id = %s"
-        result = db.execute_query(query, (prediction_id, session['user_id']))
-        
-        if not result or not result[0]['image_data']:
+        if not db.get_prediction(prediction_id, session['user_id']):
             return "Image not found", 404
         
-        prediction = result[0]
-        encrypted_data = prediction['image_data']
-        key = prediction['encryption_key'].encode()
-        
         # Decrypt image
-        decrypted_data = image_processor.decrypt_image(encrypted_data, key)
+        decrypted_data = db.get_image_blob(prediction_id)
+        if not decrypted_data:
+            return "Image not found", 404
         
         # Return as image response
         return Response(decrypted_data, mimetype='image/jpeg')
@@ -617,6 +834,89 @@ def get_encrypted_image(prediction_id):
         print(f"❌ Error retrieving encrypted image: {e}")
         return "Error retrieving image", 500
 
+@app.route('/admin/model', methods=['GET'])
+def model_status():
+    """Report the active model version and the state of any reload"""
+    if not is_admin():
+        return jsonify({"error": "Admin access required"}), 403
+
+    return jsonify({
+        "active_version": model_predictor.version,
+        "available_versions": model_predictor.list_versions(),
+        "reload": model_predictor.reload_status
+    })
+
+@app.route('/admin/model/reload', methods=['POST'])
+def reload_model():
+    """Load a model version in the background and hot-swap it in"""
+    if not is_admin():
+        return jsonify({"error": "Admin access required"}), 403
+
+    version = (request.get_json(silent=True) or {}).get('version') or request.form.get('version')
+    versions = model_predictor.list_versions()
+    if not versions:
+        # Legacy single-file layout: nothing to pin, reload this worker only
+        if version is not None:
+            return jsonify({"error": "No model registry; versions can't be selected"}), 400
+        if not model_predictor.reload_async():
+            return jsonify({"error": "A model reload is already in progress"}), 409
+        return jsonify({"success": True, "message": "Model reload started (this worker only)",
+                        "active_version": model_predictor.version}), 202
+
+    version = version or versions[-1]
+    if version not in versions:
+        return jsonify({"error": f"Unknown model version '{version}'", "available_versions": versions}), 400
+    if model_predictor.reload_status.get("state") == "loading":
+        return jsonify({"error": "A model reload is already in progress"}), 409
+
+    # Rewriting the pin rolls the version out: every worker picks it up in check_pin()
+    model_predictor.pin_version(version)
+    model_predictor.check_pin(force=True)
+
+    print(f"🔄 Model {version} pinned by {session.get('user')}")
+    return jsonify({
+        "success": True,
+        "message": f"Model {version} pinned; workers reload within {MODEL_PIN_CHECK_SECONDS:.0f}s",
+        "active_version": model_predictor.version,
+        "requested_version": version
+    }), 202
+
+@app.route('/metrics')
+def metrics():
+    """Inference admission and worker memory metrics (Prometheus text format)"""
+    body = admission_controller.prometheus_metrics() + memory_monitor.prometheus_metrics()
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+@app.route('/admin/memory')
+def memory_status():
+    """RSS, per-route memory growth and (with tracemalloc on) top allocation sites.
+    ?top= sets how many sites to list."""
+    if not is_admin():
+        return jsonify({"error": "Admin access required"}), 403
+    limit = min(request.args.get('top', 10, type=int), 100)
+    return jsonify(memory_monitor.report(limit))
+
+@app.route('/admin/memory/profile', methods=['POST'])
+def memory_profile():
+    """Opt-in tracemalloc control: {"action": "start", "frames": 10} | {"action": "dump"} | {"action": "stop"}"""
+    if not is_admin():
+        return jsonify({"error": "Admin access required"}), 403
+
+    data = request.get_json(silent=True) or {}
+    action = data.get('action', 'dump')
+    try:
+        if action == 'start':
+            memory_monitor.start_tracing(int(data.get('frames', 10)))
+            return jsonify({"success": True, "tracing": True})
+        if action == 'stop':
+            memory_monitor.stop_tracing()
+            return jsonify({"success": True, "tracing": False})
+        if action == 'dump':
+            return jsonify({"success": True, "path": memory_monitor.dump_profile()})
+        return jsonify({"error": f"Unknown action '{action}'"}), 400
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 409
+
 @app.route('/test-db')
 def test_db():
     """Test database connection"""
@@ -678,6 +978,36 @@ def create_admin_user():
             'message': f'Error: {str(e)}'
         })
 
+@app.cli.command('migrate-images')
+@click.option('--batch-size', default=500, show_default=True, help='Rows moved per transaction')
+@click.option('--pause', default=0.05, show_default=True, help='Seconds to sleep between batches')
+def migrate_images_command(batch_size, pause):
+    """Move inline image blobs out of the predictions table"""
+    if not db.migrate_image_blobs(batch_size=batch_size, pause=pause):
+        raise SystemExit(1)
+
+@app.cli.command('rescore')
+@click.option('--page-size', default=1024, show_default=True, help='Predictions streamed per batch')
+@click.option('--limit', default=None, type=int, help='Stop after this many predictions')
+@click.option('--compare/--no-compare', default=True, show_default=True,
+              help='Report memmap vs decrypt-and-decode input throughput first')
+def rescore_command(page_size, limit, compare):
+    """Re-score stored predictions with the active model version (resumable)"""
+    if compare:
+        comparison = compare_input_paths(db, model_predictor, tensor_cache)
+        if comparison:
+            print(f"📊 Input loading on {comparison['images']} images: "
+                  f"memmap {comparison['memmap_images_per_s']} images/s vs "
+                  f"decrypt+decode {comparison['decode_images_per_s']} images/s")
+
+    stats = rescore_predictions(db, model_predictor, tensor_cache, embedding_index,
+                                page_size=page_size, limit=limit)
+    print(f"✅ Re-scored {stats['rescored']} predictions in {stats['elapsed_s']:.1f}s "
+          f"({stats['rescored'] / max(stats['elapsed_s'], 1e-9):.1f} images/s); "
+          f"{stats['cache_hits']} from tensor cache, {stats['decoded']} decoded, {stats['missing']} missing")
+    print(f"   cache load {stats['cache_load_s']:.2f}s, decode {stats['decode_s']:.2f}s, "
+          f"inference {stats['inference_s']:.2f}s, write {stats['write_s']:.2f}s")
+
 # Check database on startup
 with app.app_context():
     try:
@@ -690,7 +1020,7 @@ with app.app_context():
 
 if __name__ == '__main__':
     print("🚀 Starting Alzheimer Detection Backend...")
-    print("🔗 Checking MySQL database compatibility...")
+    print(f"🔗 Checking {db.name} database compatibility...")
     
     if db.check_database_exists():
         print("✅ Database is COMPATIBLE with your existing schema!")
@@ -706,10 +1036,21 @@ if __name__ == '__main__':
     print("   http://localhost:5000/login - Login") 
     print("   http://localhost:5000/dashboard - Dashboard (requires login)")
     print("   http://localhost:5000/test-db - Test database connection")
+    print("   http://localhost:5000/metrics - Inference queue metrics")
     print("   http://localhost:5000/create-admin-user - Create test user")
     print("   http://localhost:5000/predict - MRI Prediction (requires login)")
+    print("   http://localhost:5000/jobs/predict - Queue a prediction job (requires login, POST)")
+    print("   http://localhost:5000/jobs/<id>/events - Job progress stream (SSE)")
+    print("   http://localhost:5000/predict_batch - Multi-image prediction (requires login)")
+    print("   http://localhost:5000/predict_volume - NIfTI / DICOM volume prediction (requires login)")
     print("   http://localhost:5000/get_image/<id> - Get stored MRI image")
+    print("   http://localhost:5000/gradcam/<id> - Grad-CAM heatmap for a prediction")
+    print("   http://localhost:5000/similar/<id> - Similar prior scans")
     print("   http://localhost:5000/results - Results history")
     print("   http://localhost:5000/settings - User settings")
+    print("   http://localhost:5000/admin/model - Model version status (admin)")
+    print("   http://localhost:5000/admin/page_cache/stats - History page cache stats (admin)")
+    print("   http://localhost:5000/admin/memory - Worker memory and allocation sites (admin)")
+    print("   http://localhost:5000/admin/model/reload - Hot-swap model version (admin, POST)")
     
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,74 @@
+import json
+import os
+from flask import request, url_for
+from markupsafe import Markup
+
+DIST_DIR = os.path.join('static', 'dist')
+MANIFEST_PATH = os.path.join(DIST_DIR, 'manifest.json')
+
+# Used only when build_assets.py hasn't been run (local development)
+DEV_FALLBACKS = {
+    'tailwind.css': '<script src="https://cdn.tailwindcss.com"></script>',
+    'fontawesome.css': '<link href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css" rel="stylesheet">',
+}
+
+class AssetManifest:
+    """Maps logical asset names (css/auth.css) to fingerprinted files in static/dist"""
+
+    def __init__(self, path=MANIFEST_PATH):
+        self.path = path
+        self._mtime = None
+        self._entries = {}
+
+    def entries(self):
+        # Reload when build_assets.py rewrites the manifest, without a restart
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            self._entries, self._mtime = {}, None
+            return self._entries
+        if mtime != self._mtime:
+            with open(self.path) as f:
+                self._entries = json.load(f)
+            self._mtime = mtime
+        return self._entries
+
+    def build_id(self):
+        """Changes whenever build_assets.py writes a new manifest"""
+        self.entries()
+        return str(self._mtime or 'dev')
+
+    def url(self, name):
+        hashed = self.entries().get(name)
+        if hashed:
+            return url_for('static', filename=f'dist/{hashed}')
+        if name in DEV_FALLBACKS:
+            return None
+        return url_for('static', filename=name)
+
+    def tag(self, name):
+        """<link>/<script> tag for an asset"""
+        url = self.url(name)
+        if url is None:
+            return Markup(DEV_FALLBACKS[name])
+        if name.endswith('.js'):
+            return Markup(f'<script src="{url}"></script>')
+        return Markup(f'<link rel="stylesheet" href="{url}">')
+
+asset_manifest = AssetManifest()
+
+def register_assets(app):
+    """Expose asset_url/asset_tag to templates and serve fingerprinted files
+    with far-future immutable caching"""
+    app.jinja_env.globals['asset_url'] = asset_manifest.url
+    app.jinja_env.globals['asset_tag'] = asset_manifest.tag
+
+    @app.after_request
+    def cache_fingerprinted_assets(response):
+        if request.path.startswith('/static/dist/') and response.status_code == 200 \
+                and not request.path.endswith('manifest.json'):
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = 31536000
+            response.cache_control.immutable = True
+        return response
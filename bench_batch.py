@@ -0,0 +1,66 @@
+"""Compare N sequential /predict calls against one /predict_batch call.
+
+Runs in-process through Flask's test client against the configured
+storage backend and the real model, so it measures the server-side
+cost of each path (session, model check, DB, decode and inference).
+
+    STORAGE_BACKEND=sqlite python bench_batch.py --images 32
+"""
+import argparse
+import io
+import time
+
+import numpy as np
+from PIL import Image
+
+from app import app
+
+
+def make_images(count, size):
+    rng = np.random.default_rng(0)
+    images = []
+    for i in range(count):
+        output = io.BytesIO()
+        Image.fromarray(rng.integers(0, 255, (size, size, 3), dtype=np.uint8)).save(output, format='JPEG')
+        images.append((f"scan_{i:03d}.jpg", output.getvalue()))
+    return images
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", type=int, default=32)
+    parser.add_argument("--size", type=int, default=256, help="edge length of the generated test images")
+    args = parser.parse_args()
+
+    images = make_images(args.images, args.size)
+    client = app.test_client()
+    client.get('/create-admin-user')
+    login = client.post('/login', data={'username': 'admin', 'password': 'admin123'}).get_json()
+    if not login or not login.get('success'):
+        raise SystemExit("❌ Could not log in as admin")
+
+    # Warm up the model and DB connection outside the timed sections
+    client.post('/predict', data={'image': (io.BytesIO(images[0][1]), images[0][0], 'image/jpeg')})
+
+    start = time.perf_counter()
+    for name, data in images:
+        response = client.post('/predict', data={'image': (io.BytesIO(data), name, 'image/jpeg')})
+        assert response.status_code == 200, response.get_data(as_text=True)
+    sequential_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    response = client.post('/predict_batch', data={
+        'images': [(io.BytesIO(data), name, 'image/jpeg') for name, data in images]
+    })
+    batch_s = time.perf_counter() - start
+    body = response.get_json()
+    assert response.status_code == 200 and body['succeeded'] == args.images, body
+
+    print(f"📊 {args.images} images of {args.size}x{args.size}")
+    print(f"   sequential /predict  {sequential_s:7.2f} s  {args.images / sequential_s:7.1f} images/s")
+    print(f"   one /predict_batch   {batch_s:7.2f} s  {args.images / batch_s:7.1f} images/s")
+    print(f"   speed-up             {sequential_s / batch_s:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Benchmark history-query latency with image blobs inline vs split out.
+
+Creates a scratch database, fills an inline layout (image_data on the
+predictions row) and a split layout (prediction_images side table) with
+the same rows, then times the queries the history pages run.
+
+    python bench_history.py --rows 100000
+
+Connects with the same MYSQL_HOST / MYSQL_USER / MYSQL_PASSWORD settings
+as the app's MySQL backend.
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+import mysql.connector
+
+INLINE_SCHEMA = [
+    "DROP TABLE IF EXISTS inline_predictions",
+    """CREATE TABLE inline_predictions (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        user_id INT, image_path VARCHAR(500), prediction_result VARCHAR(255),
+        confidence FLOAT, image_data LONGBLOB, image_hash VARCHAR(255),
+        encryption_key VARCHAR(255), model_version VARCHAR(64), prediction_date DATETIME,
+        INDEX idx_user_date (user_id, prediction_date))""",
+]
+SPLIT_SCHEMA = [
+    "DROP TABLE IF EXISTS split_prediction_images",
+    "DROP TABLE IF EXISTS split_predictions",
+    """CREATE TABLE split_predictions (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        user_id INT, image_path VARCHAR(500), prediction_result VARCHAR(255),
+        confidence FLOAT, image_hash VARCHAR(255), model_version VARCHAR(64), prediction_date DATETIME,
+        INDEX idx_user_date (user_id, prediction_date))""",
+    """CREATE TABLE split_prediction_images (
+        prediction_id INT PRIMARY KEY, image_data LONGBLOB NOT NULL, encryption_key VARCHAR(255))""",
+]
+COLUMNS = "id, user_id, image_path, prediction_result, confidence, image_hash, model_version, prediction_date"
+CLASSES = ["MildDemented", "ModerateDemented", "NonDemented", "VeryMildDemented"]
+
+
+def seed(conn, rows, users, blob_size, batch=1000):
+    cursor = conn.cursor()
+    for statement in INLINE_SCHEMA + SPLIT_SCHEMA:
+        cursor.execute(statement)
+
+    blob = os.urandom(blob_size)
+    start_date = datetime.now() - timedelta(days=365)
+    for offset in range(0, rows, batch):
+        meta = []
+        for i in range(offset, min(offset + batch, rows)):
+            meta.append((random.randint(1, users), f"prediction_{i}.jpg",
+                         random.choice(CLASSES), random.random(), f"{i:064x}", "bench",
+                         start_date + timedelta(seconds=i * 30)))
+        cursor.executemany(
+            "INSERT INTO inline_predictions (user_id, image_path, prediction_result, confidence, "
+            "image_hash, model_version, prediction_date, image_data, encryption_key) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, 'key')",
+            [m + (blob,) for m in meta])
+        cursor.executemany(
+            "INSERT INTO split_predictions (user_id, image_path, prediction_result, confidence, "
+            "image_hash, model_version, prediction_date) VALUES (%s, %s, %s, %s, %s, %s, %s)", meta)
+        cursor.executemany(
+            "INSERT INTO split_prediction_images (prediction_id, image_data, encryption_key) "
+            "VALUES (%s, %s, 'key')",
+            [(i + 1, blob) for i in range(offset, offset + len(meta))])
+        conn.commit()
+        print(f"🌱 Seeded {offset + len(meta)}/{rows} rows", end="\r")
+    print()
+    cursor.close()
+
+
+def time_query(conn, query, params_fn, repeat):
+    cursor = conn.cursor()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cursor.execute(query, params_fn())
+        cursor.fetchall()
+        samples.append((time.perf_counter() - start) * 1000)
+    cursor.close()
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--blob-size", type=int, default=16384, help="bytes per stored image")
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--database", default="alzheimer_app_bench")
+    parser.add_argument("--skip-seed", action="store_true")
+    args = parser.parse_args()
+
+    conn = mysql.connector.connect(host=os.environ.get("MYSQL_HOST", "localhost"),
+                                   user=os.environ.get("MYSQL_USER", "root"),
+                                   password=os.environ.get("MYSQL_PASSWORD", ""))
+    conn.cursor().execute(f"CREATE DATABASE IF NOT EXISTS {args.database}")
+    conn.database = args.database
+
+    if not args.skip_seed:
+        seed(conn, args.rows, args.users, args.blob_size)
+
+    user = lambda: (random.randint(1, args.users),)
+    cases = [
+        ("history (before: SELECT * inline)",
+         "SELECT * FROM inline_predictions WHERE user_id = %s ORDER BY prediction_date DESC", user),
+        ("history (after: split table)",
+         f"SELECT {COLUMNS} FROM split_predictions WHERE user_id = %s ORDER BY prediction_date DESC", user),
+        ("full scan (before: inline)",
+         "SELECT prediction_result, COUNT(*) FROM inline_predictions GROUP BY prediction_result", lambda: ()),
+        ("full scan (after: split table)",
+         "SELECT prediction_result, COUNT(*) FROM split_predictions GROUP BY prediction_result", lambda: ()),
+    ]
+
+    print(f"📊 {args.rows} rows, {args.blob_size} B images, {args.repeat} runs each")
+    for name, query, params_fn in cases:
+        median, p95 = time_query(conn, query, params_fn, args.repeat)
+        print(f"   {name:<36} median {median:8.2f} ms   p95 {p95:8.2f} ms")
+
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Check and benchmark storage backends through the Storage interface.
+
+Every backend runs the same round-trip checks (users, predictions,
+history, images) and then the same timed workload, so results are
+directly comparable.
+
+    python bench_storage.py --backend sqlite --backend mysql --rows 20000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+import uuid
+
+from storage import create_storage
+from image_utils import image_processor
+
+CLASSES = ["MildDemented", "ModerateDemented", "NonDemented", "VeryMildDemented"]
+
+
+def make_storage(backend, workdir):
+    if backend == 'sqlite':
+        os.environ['SQLITE_PATH'] = os.path.join(workdir, 'bench.db')
+    elif backend == 'mysql':
+        os.environ.setdefault('MYSQL_DATABASE', 'alzheimer_app_bench')
+    return create_storage(backend)
+
+
+def check_round_trip(db):
+    """Exercise every Storage method once and verify what comes back"""
+    tag = uuid.uuid4().hex[:8]
+    user = {'username': f'bench_{tag}', 'email': f'{tag}@bench.local', 'birth_year': 1970,
+            'gender': 'Other', 'blood_group': 'A+', 'address': 'bench', 'password': 'bench123'}
+
+    assert not db.check_user_exists(user['username'], user['email'])
+    assert db.register_user(user)
+    assert db.check_user_exists(user['username'], user['email'])
+    row = db.authenticate_user_by_username_or_email(user['email'], 'bench123')
+    assert row and row['username'] == user['username']
+    assert db.authenticate_user_by_username_or_email(user['email'], 'wrong') is None
+
+    key = image_processor.generate_key()
+    payload = os.urandom(4096)
+    assert db.insert_prediction(row['id'], f'bench_{tag}.jpg', '{"prediction": "NonDemented", "confidence": 0.5}',
+                                0.5, image_processor.generate_hash(payload), 'bench',
+                                image_processor.encrypt_image(payload, key), key.decode())
+
+    history = db.get_user_predictions(row['id'])
+    assert len(history) == 1 and history[0]['parsed_result']['prediction'] == 'NonDemented'
+    assert 'image_data' not in history[0]
+    assert db.get_prediction(history[0]['id'], row['id'] + 1) is None
+    assert db.get_image_blob(history[0]['id']) == payload
+    return row['id']
+
+
+def seed(db, rows, users):
+    key = image_processor.generate_key()
+    blob = image_processor.encrypt_image(os.urandom(16384), key)
+    user_ids = []
+    for i in range(users):
+        tag = uuid.uuid4().hex[:8]
+        db.register_user({'username': f'seed_{tag}', 'email': f'{tag}@seed.local', 'birth_year': 1960,
+                          'gender': 'Other', 'blood_group': 'O+', 'address': 'seed', 'password': 'seed123'})
+        user_ids.append(db.authenticate_user_by_username_or_email(f'{tag}@seed.local', 'seed123')['id'])
+
+    for i in range(rows):
+        label = random.choice(CLASSES)
+        db.insert_prediction(random.choice(user_ids), f'seed_{i}.jpg',
+                             f'{{"prediction": "{label}", "confidence": 0.9}}', 0.9, f'{i:064x}',
+                             'bench', blob, key.decode())
+    return user_ids
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[max(0, int(len(samples) * 0.95) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backend', action='append', choices=['sqlite', 'mysql'])
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    for backend in args.backend or ['sqlite']:
+        with tempfile.TemporaryDirectory() as workdir:
+            db = make_storage(backend, workdir)
+            check_round_trip(db)
+            print(f"✅ {backend}: round-trip checks passed")
+
+            start = time.perf_counter()
+            user_ids = seed(db, args.rows, args.users)
+            seed_s = time.perf_counter() - start
+            history = db.get_user_predictions(user_ids[0])
+            prediction_id = history[0]['id']
+
+            print(f"📊 {backend}: {args.rows} predictions seeded in {seed_s:.1f}s "
+                  f"({args.rows / seed_s:.0f} inserts/s)")
+            cases = [
+                ('history query', lambda: db.get_user_predictions(random.choice(user_ids))),
+                ('single prediction', lambda: db.get_prediction(prediction_id, user_ids[0])),
+                ('image fetch+decrypt', lambda: db.get_image_blob(prediction_id)),
+            ]
+            for name, fn in cases:
+                median, p95 = timed(fn, args.repeat)
+                print(f"   {name:<22} median {median:7.2f} ms   p95 {p95:7.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+"""Build self-hosted, fingerprinted static assets.
+
+Replaces the in-browser Tailwind JIT runtime (cdn.tailwindcss.com) with a
+purged, minified stylesheet generated from the classes the templates and
+scripts actually use. Vendors Font Awesome for offline networks and
+content-hashes every file into static/dist. Also writes
+static/dist/manifest.json, which templates resolve through asset_tag().
+
+    python build_assets.py            # needs network once to fetch the CLI / Font Awesome
+    TAILWIND_CLI=/opt/tailwindcss python build_assets.py
+"""
+import argparse
+import glob
+import gzip
+import hashlib
+import json
+import os
+import platform
+import re
+import shutil
+import stat
+import subprocess
+import tempfile
+import urllib.request
+
+TAILWIND_VERSION = "3.4.17"
+FONTAWESOME_VERSION = "6.0.0"
+FONTAWESOME_BASE = f"https://cdnjs.cloudflare.com/ajax/libs/font-awesome/{FONTAWESOME_VERSION}"
+TAILWIND_RUNTIME_URL = "https://cdn.tailwindcss.com"
+
+DIST_DIR = os.path.join("static", "dist")
+VENDOR_CACHE = os.path.join("cache", "vendor")
+CONTENT_GLOBS = ["templates/**/*.html", "static/js/**/*.js"]
+
+
+def download(url, target):
+    """Fetch url into target once; later builds reuse the cached copy offline"""
+    if not os.path.exists(target):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        print(f"📥 Downloading {url}")
+        with urllib.request.urlopen(url, timeout=60) as response, open(target + ".part", "wb") as f:
+            shutil.copyfileobj(response, f)
+        os.replace(target + ".part", target)
+    return target
+
+
+def tailwind_cli(explicit=None):
+    cli = explicit or os.environ.get("TAILWIND_CLI") or shutil.which("tailwindcss")
+    if cli:
+        return cli
+
+    system = {"Linux": "linux", "Darwin": "macos", "Windows": "windows"}[platform.system()]
+    arch = "arm64" if platform.machine().lower() in ("arm64", "aarch64") else "x64"
+    name = f"tailwindcss-{system}-{arch}" + (".exe" if system == "windows" else "")
+    path = download(
+        f"https://github.com/tailwindlabs/tailwindcss/releases/download/v{TAILWIND_VERSION}/{name}",
+        os.path.join(VENDOR_CACHE, f"tailwind-{TAILWIND_VERSION}", name),
+    )
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    return path
+
+
+def build_tailwind(cli):
+    """Run the Tailwind CLI over the templates; returns minified CSS"""
+    with tempfile.TemporaryDirectory() as workdir:
+        config = os.path.join(workdir, "tailwind.config.js")
+        source = os.path.join(workdir, "input.css")
+        output = os.path.join(workdir, "output.css")
+        content = [os.path.abspath(pattern).replace("\\", "/") for pattern in CONTENT_GLOBS]
+        with open(config, "w") as f:
+            f.write(f"module.exports = {{ content: {json.dumps(content)} }};\n")
+        with open(source, "w") as f:
+            f.write("@tailwind base;\n@tailwind components;\n@tailwind utilities;\n")
+        subprocess.run([cli, "-c", config, "-i", source, "-o", output, "--minify"], check=True)
+        with open(output, "rb") as f:
+            return f.read()
+
+
+def minify_css(css):
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    # ':' is left alone: "a :hover" and "a:hover" are different selectors
+    css = re.sub(r"\s*([{};,>])\s*", r"\1", css)
+    return css.replace(";}", "}").strip()
+
+
+def minify_js(js):
+    """Conservative: drop blank lines, full-line // comments and indentation.
+    Nothing inside a statement is rewritten."""
+    lines = (line.strip() for line in js.splitlines())
+    return "\n".join(line for line in lines if line and not line.startswith("//")) + "\n"
+
+
+def fingerprint(name, data):
+    stem, ext = os.path.splitext(os.path.basename(name))
+    return f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+
+
+def write_asset(manifest, name, data):
+    hashed = fingerprint(name, data)
+    with open(os.path.join(DIST_DIR, hashed), "wb") as f:
+        f.write(data)
+    manifest[name] = hashed
+    return hashed
+
+
+def vendor_fontawesome(manifest):
+    css_path = download(f"{FONTAWESOME_BASE}/css/all.min.css",
+                        os.path.join(VENDOR_CACHE, f"fontawesome-{FONTAWESOME_VERSION}", "all.min.css"))
+    with open(css_path, encoding="utf-8") as f:
+        css = f.read()
+
+    def replace(match):
+        font = match.group(1)
+        local = download(f"{FONTAWESOME_BASE}/webfonts/{font}",
+                         os.path.join(VENDOR_CACHE, f"fontawesome-{FONTAWESOME_VERSION}", font))
+        with open(local, "rb") as f:
+            return f"url({write_asset(manifest, 'webfonts/' + font, f.read())})"
+
+    css = re.sub(r"url\(\.\./webfonts/([^)?#]+)[^)]*\)", replace, css)
+    write_asset(manifest, "fontawesome.css", css.encode("utf-8"))
+
+
+def gz_size(data):
+    return len(gzip.compress(data, 9))
+
+
+def report(manifest, runtime_bytes):
+    """Per-page transfer size of render-blocking assets, before vs after"""
+    def dist_bytes(name):
+        with open(os.path.join(DIST_DIR, manifest[name]), "rb") as f:
+            return f.read()
+
+    print("\n📊 Render-blocking asset weight per page (gzip):")
+    for template in sorted(glob.glob("templates/*.html")):
+        with open(template, encoding="utf-8") as f:
+            names = [n for n in re.findall(r"asset_tag\('([^']+)'\)", f.read()) if n in manifest]
+        if not names:
+            continue
+        shared = sum(gz_size(dist_bytes(n)) for n in names if n != "tailwind.css")
+        after = shared + (gz_size(dist_bytes("tailwind.css")) if "tailwind.css" in names else 0)
+        if runtime_bytes:
+            before = shared + (gz_size(runtime_bytes) if "tailwind.css" in names else 0)
+            before_text = f"{before / 1024:7.1f} KB"
+        else:
+            before_text = "    n/a   "
+        print(f"   {os.path.basename(template):<24} before {before_text}  after {after / 1024:7.1f} KB")
+
+    if runtime_bytes:
+        print(f"   Tailwind JIT runtime: {len(runtime_bytes) / 1024:.0f} KB raw / "
+              f"{gz_size(runtime_bytes) / 1024:.0f} KB gzip of JavaScript that must download, parse and "
+              f"generate styles before first styled paint")
+    print(f"   Purged tailwind.css: {len(dist_bytes('tailwind.css')) / 1024:.1f} KB raw / "
+          f"{gz_size(dist_bytes('tailwind.css')) / 1024:.1f} KB gzip, applied as soon as it arrives")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tailwind-cli", help="path to the Tailwind standalone CLI")
+    parser.add_argument("--skip-fontawesome", action="store_true", help="keep loading Font Awesome from the CDN")
+    args = parser.parse_args()
+
+    if os.path.isdir(DIST_DIR):
+        shutil.rmtree(DIST_DIR)
+    os.makedirs(DIST_DIR)
+    manifest = {}
+
+    print("🎨 Building purged Tailwind CSS...")
+    write_asset(manifest, "tailwind.css", build_tailwind(tailwind_cli(args.tailwind_cli)))
+
+    if not args.skip_fontawesome:
+        print("🔤 Vendoring Font Awesome...")
+        vendor_fontawesome(manifest)
+
+    for path in sorted(glob.glob("static/css/*.css")):
+        with open(path, encoding="utf-8") as f:
+            write_asset(manifest, os.path.relpath(path, "static").replace("\\", "/"),
+                        minify_css(f.read()).encode("utf-8"))
+    for path in sorted(glob.glob("static/js/*.js")):
+        with open(path, encoding="utf-8") as f:
+            write_asset(manifest, os.path.relpath(path, "static").replace("\\", "/"),
+                        minify_js(f.read()).encode("utf-8"))
+
+    with open(os.path.join(DIST_DIR, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    print(f"✅ {len(manifest)} assets written to {DIST_DIR}")
+
+    try:
+        with open(download(TAILWIND_RUNTIME_URL, os.path.join(VENDOR_CACHE, "tailwind-runtime.js")), "rb") as f:
+            runtime = f.read()
+    except OSError as e:
+        print(f"⚠️ Could not fetch the Tailwind runtime for comparison: {e}")
+        runtime = None
+    report(manifest, runtime)
+
+
+if __name__ == "__main__":
+    main()
@@ -32,4 +32,26 @@ USE alzheimer_app;
 
 
 -- Update the existing image_path column to be more flexible
-ALTER TABLE predictions MODIFY image_path VARCHAR(500);
\ No newline at end of file
+ALTER TABLE predictions MODIFY image_path VARCHAR(500);
+
+-- Model version that produced each prediction (see models/registry/)
+ALTER TABLE predictions ADD COLUMN model_version VARCHAR(64);
+
+-- Image payloads live outside predictions so history scans stay small.
+-- Move existing inline blobs with: flask --app app migrate-images
+-- then optionally: ALTER TABLE predictions DROP COLUMN image_data, ALGORITHM=INPLACE, LOCK=NONE;
+CREATE TABLE prediction_images (
+    prediction_id INT PRIMARY KEY,
+    image_data LONGBLOB NOT NULL,
+    encryption_key VARCHAR(255),
+    FOREIGN KEY (prediction_id) REFERENCES predictions(id) ON DELETE CASCADE
+);
+
+CREATE INDEX idx_predictions_user_date ON predictions (user_id, prediction_date);
+
+-- Bumped on every history write; keys ETags and the rendered-page cache
+ALTER TABLE users ADD COLUMN history_version INT NOT NULL DEFAULT 0;
+
+-- 'volume' rows hold a multi-slice result under one representative slice;
+-- flask rescore skips them
+ALTER TABLE predictions ADD COLUMN source VARCHAR(16) NOT NULL DEFAULT 'image';
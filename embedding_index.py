@@ -0,0 +1,309 @@
+import os
+import re
+import threading
+import traceback
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process deployments only
+    fcntl = None
+
+def _lock_file(f, exclusive):
+    if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+def _unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_UN)
+
+def _safe_version(model_version):
+    return "".join(c for c in str(model_version) if c.isalnum() or c in ('-', '_', '.'))
+
+SKETCH_BITS = 128
+_M1 = np.uint64(0x5555555555555555)
+_M2 = np.uint64(0x3333333333333333)
+_M4 = np.uint64(0x0f0f0f0f0f0f0f0f)
+_H01 = np.uint64(0x0101010101010101)
+_S1, _S2, _S4, _S56 = (np.uint64(shift) for shift in (1, 2, 4, 56))
+
+def _hamming(sketch, query_bits, chunk=16384):
+    """Bit distance from query_bits to every row of sketch (uint64 words),
+    with a SWAR popcount over cache-sized chunks"""
+    out = np.empty(len(sketch), dtype=np.uint8)
+    x = np.empty((chunk, sketch.shape[1]), dtype=np.uint64)
+    y = np.empty_like(x)
+    for start in range(0, len(sketch), chunk):
+        end = min(start + chunk, len(sketch))
+        a, b = x[:end - start], y[:end - start]
+        np.bitwise_xor(sketch[start:end], query_bits, out=a)
+        np.right_shift(a, _S1, out=b); b &= _M1; a -= b
+        np.right_shift(a, _S2, out=b); b &= _M2; a &= _M2; a += b
+        np.right_shift(a, _S4, out=b); a += b; a &= _M4
+        words = a[:, 0]
+        for i in range(1, a.shape[1]):
+            words += a[:, i]
+        words *= _H01
+        words >>= _S56
+        np.copyto(out[start:end], words, casting='unsafe')
+    return out
+
+class _Partition:
+    """Embeddings produced by one model version, in one append-only file of
+    fixed-width (prediction id, owner id, vector) records.
+
+    Besides the float32 vectors, each row keeps an int8 copy and a
+    SKETCH_BITS-bit SimHash (signs against fixed random hyperplanes),
+    built in memory as rows load. They let a large search shortlist rows
+    without a full float32 scan."""
+
+    def __init__(self, path, dim):
+        self.path = path
+        self.dim = dim
+        self.record = np.dtype([('id', '<i8'), ('owner', '<i8'), ('vector', '<f4', (dim,))])
+        self._lock = threading.Lock()
+        self.size = 0
+        self._vectors = np.empty((0, dim), dtype=np.float32)
+        self._ids = np.empty(0, dtype=np.int64)
+        self._owners = np.empty(0, dtype=np.int64)
+        self._codes = np.empty((0, dim), dtype=np.int8)
+        self._sketch = np.empty((0, SKETCH_BITS // 64), dtype=np.uint64)
+        planes, _ = np.linalg.qr(np.random.default_rng(0).standard_normal((max(dim, SKETCH_BITS), SKETCH_BITS)))
+        self._planes = planes[:dim].astype(np.float32)
+        with open(self.path, 'ab'):
+            pass
+
+    def _reserve(self, capacity):
+        """Grow the in-memory buffers geometrically so appends are amortised O(1)"""
+        if capacity <= len(self._ids):
+            return
+        capacity = max(capacity, len(self._ids) * 2, 1024)
+        vectors = np.empty((capacity, self.dim), dtype=np.float32)
+        ids = np.empty(capacity, dtype=np.int64)
+        owners = np.empty(capacity, dtype=np.int64)
+        codes = np.empty((capacity, self.dim), dtype=np.int8)
+        sketch = np.empty((capacity, SKETCH_BITS // 64), dtype=np.uint64)
+        vectors[:self.size] = self._vectors[:self.size]
+        ids[:self.size] = self._ids[:self.size]
+        owners[:self.size] = self._owners[:self.size]
+        codes[:self.size] = self._codes[:self.size]
+        sketch[:self.size] = self._sketch[:self.size]
+        self._vectors, self._ids, self._owners = vectors, ids, owners
+        self._codes, self._sketch = codes, sketch
+
+    def _sketch_of(self, vectors):
+        return np.packbits(vectors @ self._planes > 0, axis=-1).view(np.uint64)
+
+    def _read_new(self, f, file_size):
+        """Load records [self.size, file_size // itemsize). Caller holds a file lock"""
+        size = file_size // self.record.itemsize
+        if size <= self.size:
+            return
+        f.seek(self.size * self.record.itemsize)
+        records = np.fromfile(f, dtype=self.record, count=size - self.size)
+        self._reserve(size)
+        self._vectors[self.size:size] = records['vector']
+        self._ids[self.size:size] = records['id']
+        self._owners[self.size:size] = records['owner']
+        # Vectors are unit length, so every component fits [-127, 127] after scaling
+        self._codes[self.size:size] = np.rint(records['vector'] * 127)
+        self._sketch[self.size:size] = self._sketch_of(records['vector'])
+        self.size = size
+
+    def refresh(self):
+        """Pick up records appended by other processes"""
+        if os.path.getsize(self.path) // self.record.itemsize <= self.size:
+            return
+        with self._lock, open(self.path, 'rb') as f:
+            # Shared lock: never read a record another process is still writing
+            _lock_file(f, exclusive=False)
+            try:
+                self._read_new(f, os.fstat(f.fileno()).st_size)
+            finally:
+                _unlock_file(f)
+
+    def append(self, ids, owners, vectors):
+        records = np.empty(len(ids), dtype=self.record)
+        records['id'], records['owner'], records['vector'] = ids, owners, vectors
+        with self._lock, open(self.path, 'r+b') as f:
+            _lock_file(f, exclusive=True)
+            try:
+                file_size = os.fstat(f.fileno()).st_size
+                if file_size % self.record.itemsize:
+                    # Torn record from a crashed writer
+                    file_size -= file_size % self.record.itemsize
+                    f.truncate(file_size)
+                self._read_new(f, file_size)
+                f.seek(file_size)
+                f.write(records.tobytes())
+                f.flush()
+                self._read_new(f, file_size + records.nbytes)
+            finally:
+                _unlock_file(f)
+
+    def snapshot(self):
+        """(vectors, ids, owners) views over the loaded rows"""
+        self.refresh()
+        size = self.size
+        return self._vectors[:size], self._ids[:size], self._owners[:size]
+
+    def shortlist(self, query, size, candidates, keep, chunk=1024):
+        """Rows among the first `size` likely to score highest against the
+        unit-length query: the `candidates` nearest by sketch distance,
+        narrowed to the best `keep` by int8 dot product"""
+        distances = _hamming(self._sketch[:size], self._sketch_of(query))
+        if candidates < size:
+            # Distances are small integers: a histogram finds the cut-off without a sort
+            cutoff = int(np.searchsorted(np.cumsum(np.bincount(distances)), candidates))
+            rows = np.flatnonzero(distances < cutoff)
+            ties = np.flatnonzero(distances == cutoff)[:candidates - len(rows)]
+            rows = np.concatenate([rows, ties])
+        else:
+            rows = np.arange(size)
+        if len(rows) <= keep:
+            return rows
+
+        codes = np.empty((chunk, self.dim), dtype=np.int8)
+        block = np.empty((chunk, self.dim), dtype=np.float32)
+        scores = np.empty(len(rows), dtype=np.float32)
+        for start in range(0, len(rows), chunk):
+            end = min(start + chunk, len(rows))
+            np.take(self._codes, rows[start:end], axis=0, out=codes[:end - start])
+            np.copyto(block[:end - start], codes[:end - start], casting='unsafe')
+            # einsum's own SIMD loop beats BLAS gemv on blocks this size
+            np.einsum('ij,j->i', block[:end - start], query, out=scores[start:end])
+        return rows[np.argpartition(scores, len(rows) - keep)[-keep:]]
+
+class EmbeddingIndex:
+    """Append-only cosine-similarity index over prediction embeddings.
+
+    Embeddings from different models live in different spaces (and may
+    differ in width), so the index is partitioned by model version and a
+    search only ever compares vectors from the same version. Each
+    partition is one file, <version>.d<dim>.bin, of fixed-width records
+    appended under an exclusive flock. Every process reloads a partition
+    when its file grows, so predictions made on one worker are searchable
+    from all of them.
+
+    Vectors are L2-normalised on insert and kept in memory as one
+    contiguous float32 matrix. A patient's search, or any search over at
+    most exact_max_rows vectors, is a single matrix-vector product
+    followed by an argpartition. A full float32 scan is memory-bound
+    (about 110 ms per 1M x 128 on one core), so clinic-wide searches over
+    larger partitions first shortlist rows by sketch distance and int8
+    score, then rank the shortlist exactly in float32.
+    """
+
+    def __init__(self, index_dir=None, exact_max_rows=None, candidates=None):
+        self.index_dir = index_dir or os.environ.get('EMBEDDING_INDEX_DIR', os.path.join('cache', 'embeddings'))
+        self.exact_max_rows = exact_max_rows or int(os.environ.get('EMBEDDING_EXACT_MAX_ROWS', 200000))
+        self.candidates = candidates or int(os.environ.get('EMBEDDING_CANDIDATES', 80000))
+        os.makedirs(self.index_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._partitions = {}
+
+    def _partition(self, model_version, dim=None):
+        """The partition for a model version; created on first write (dim given)"""
+        key = _safe_version(model_version)
+        with self._lock:
+            partition = self._partitions.get(key)
+            if partition is None:
+                existing = [match for match in map(re.compile(re.escape(key) + r"\.d(\d+)\.bin").fullmatch,
+                                                   sorted(os.listdir(self.index_dir))) if match]
+                if existing:
+                    partition = _Partition(os.path.join(self.index_dir, existing[0].group(0)),
+                                           int(existing[0].group(1)))
+                elif dim is not None:
+                    partition = _Partition(os.path.join(self.index_dir, f"{key}.d{dim}.bin"), dim)
+                else:
+                    return None
+                self._partitions[key] = partition
+        if dim is not None and dim != partition.dim:
+            raise ValueError(f"Embedding dim {dim} does not match dim {partition.dim} of model {model_version}")
+        return partition
+
+    def add(self, prediction_id, user_id, embedding, model_version):
+        return self.add_many([prediction_id], [user_id], np.asarray(embedding, dtype=np.float32).reshape(1, -1),
+                             model_version)
+
+    def add_many(self, prediction_ids, user_ids, embeddings, model_version):
+        """Append a batch of embeddings (rows of a 2-D array) made by model_version.
+        The predictions are already saved by the time this runs, so a failure
+        is logged and reported as False rather than raised"""
+        try:
+            embeddings = np.asarray(embeddings, dtype=np.float32)
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / np.maximum(norms, 1e-12)
+            partition = self._partition(model_version, embeddings.shape[1])
+            partition.append(np.asarray(prediction_ids, dtype=np.int64),
+                             np.asarray(user_ids, dtype=np.int64), embeddings)
+            return True
+        except Exception as e:
+            print(f"⚠️ Embedding index write failed ({len(prediction_ids)} vectors, model {model_version}): {e}")
+            traceback.print_exc()
+            return False
+
+    def count(self, model_version):
+        partition = self._partition(model_version)
+        return len(partition.snapshot()[1]) if partition else 0
+
+    def get(self, prediction_id, model_version):
+        """Return the stored (normalised) embedding for a prediction, or None"""
+        partition = self._partition(model_version)
+        if partition is None:
+            return None
+        vectors, ids, _ = partition.snapshot()
+        matches = np.flatnonzero(ids == prediction_id)
+        if len(matches) == 0:
+            return None
+        return vectors[matches[-1]].copy()
+
+    def search(self, query, model_version, k=10, owner_id=None, exclude_id=None):
+        """Top-k cosine search within one model version's embeddings.
+        Returns [(prediction_id, score), ...] best first"""
+        partition = self._partition(model_version)
+        if partition is None:
+            return []
+        vectors, ids, owners = partition.snapshot()
+        if len(ids) == 0:
+            return []
+
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+        if owner_id is not None:
+            # Gather one patient's rows first: scoring a few hundred vectors
+            # is far cheaper than masking scores over the whole matrix
+            rows = np.flatnonzero(owners == owner_id)
+        elif len(ids) > self.exact_max_rows:
+            rows = partition.shortlist(query, len(ids), self.candidates, keep=max(k * 20, 200))
+        else:
+            rows = None
+        if rows is not None:
+            vectors = vectors[rows]
+            ids = ids[rows]
+            if len(ids) == 0:
+                return []
+
+        scores = vectors @ query
+
+        if exclude_id is not None:
+            scores[ids == exclude_id] = -np.inf
+
+        # Over-fetch a little so duplicate ids don't shrink the result
+        fetch = min(k * 2, len(ids))
+        top = np.argpartition(scores, len(scores) - fetch)[-fetch:]
+        top = top[np.argsort(-scores[top])]
+
+        results, seen = [], set()
+        for i in top:
+            if not np.isfinite(scores[i]) or ids[i] in seen:
+                continue
+            seen.add(ids[i])
+            results.append((int(ids[i]), float(scores[i])))
+            if len(results) == k:
+                break
+        return results
+
+# Initialize embedding index
+embedding_index = EmbeddingIndex()
@@ -0,0 +1,132 @@
+import os
+import threading
+import time
+
+class HeatmapCache:
+    """Size-bounded disk cache for Grad-CAM overlays.
+
+    Entries are keyed by image hash + model version, so a new model never
+    serves a stale heatmap. Concurrent requests for the same key are
+    coalesced: only the first caller computes, the others wait for it.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=None):
+        self.cache_dir = cache_dir or os.environ.get('HEATMAP_CACHE_DIR', os.path.join('cache', 'heatmaps'))
+        self.max_bytes = max_bytes or int(os.environ.get('HEATMAP_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0,
+                      'hit_ms_total': 0.0, 'miss_ms_total': 0.0}
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.png")
+
+    def make_key(self, image_hash, model_version):
+        safe_version = "".join(c for c in str(model_version) if c.isalnum() or c in ('-', '_', '.'))
+        return f"{image_hash}_{safe_version}"
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        # Touch so eviction is least-recently-used rather than oldest-written
+        try:
+            os.utime(path, None)
+        except FileNotFoundError:
+            pass  # Evicted by another request since the read; the bytes are still good
+        return data
+
+    def put(self, key, data):
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.png'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+
+        if total <= self.max_bytes:
+            return
+
+        for _, size, path in sorted(entries):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            self.stats['evictions'] += 1
+            if total <= self.max_bytes:
+                break
+
+    def get_or_compute(self, key, compute):
+        """Return (data, was_cached, elapsed_ms), calling compute() at most
+        once per key across concurrent callers"""
+        start = time.perf_counter()
+
+        data = self.get(key)
+        if data is not None:
+            return self._record(data, True, start)
+
+        with self._lock:
+            event = self._inflight.get(key)
+            leader = event is None
+            if leader:
+                event = threading.Event()
+                self._inflight[key] = event
+
+        if not leader:
+            event.wait()
+            data = self.get(key)
+            if data is not None:
+                return self._record(data, True, start)
+            # Leader failed - fall through and try ourselves
+            return self._record(compute(), False, start)
+
+        try:
+            data = compute()
+            self.put(key, data)
+            return self._record(data, False, start)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            event.set()
+
+    def _record(self, data, cached, start):
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if cached:
+            self.stats['hits'] += 1
+            self.stats['hit_ms_total'] += elapsed_ms
+        else:
+            self.stats['misses'] += 1
+            self.stats['miss_ms_total'] += elapsed_ms
+        return data, cached, elapsed_ms
+
+    def summary(self):
+        hits, misses = self.stats['hits'], self.stats['misses']
+        return {
+            'hits': hits,
+            'misses': misses,
+            'evictions': self.stats['evictions'],
+            'avg_cached_ms': round(self.stats['hit_ms_total'] / hits, 2) if hits else None,
+            'avg_cold_ms': round(self.stats['miss_ms_total'] / misses, 2) if misses else None,
+        }
+
+# Initialize heatmap cache
+heatmap_cache = HeatmapCache()
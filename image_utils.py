@@ -4,6 +4,7 @@ from cryptography.fernet import Fernet
 from PIL import Image
 import io
 import base64
+import numpy as np
 
 class ImageProcessor:
     def __init__(self):
@@ -47,25 +48,25 @@ class ImageProcessor:
                 image_data = image_file
                 print(f"📊 Original image size: {len(image_data)} bytes")
             
-            # Open image from bytes
-            image = Image.open(io.BytesIO(image_data))
-            print(f"🖼️ Image mode: {image.mode}, Size: {image.size}")
-            
-            # Convert to RGB if necessary
-            if image.mode in ('RGBA', 'P', 'LA'):
-                image = image.convert('RGB')
-                print("🔄 Converted image to RGB")
-            
-            # Resize if larger than max_size
-            if image.size[0] > max_size[0] or image.size[1] > max_size[1]:
-                image.thumbnail(max_size, Image.Resampling.LANCZOS)
-                print(f"📐 Resized image to: {image.size}")
-            
-            # Save to bytes with compression
-            img_byte_arr = io.BytesIO()
-            image.save(img_byte_arr, format='JPEG', quality=85, optimize=True)
-            compressed_data = img_byte_arr.getvalue()
-            
+            # Open image from bytes; closing it frees the decoder buffers right away
+            with Image.open(io.BytesIO(image_data)) as image:
+                print(f"🖼️ Image mode: {image.mode}, Size: {image.size}")
+
+                # Convert to RGB if necessary
+                if image.mode in ('RGBA', 'P', 'LA'):
+                    image = image.convert('RGB')
+                    print("🔄 Converted image to RGB")
+
+                # Resize if larger than max_size
+                if image.size[0] > max_size[0] or image.size[1] > max_size[1]:
+                    image.thumbnail(max_size, Image.Resampling.LANCZOS)
+                    print(f"📐 Resized image to: {image.size}")
+
+                # Save to bytes with compression
+                img_byte_arr = io.BytesIO()
+                image.save(img_byte_arr, format='JPEG', quality=85, optimize=True)
+                compressed_data = img_byte_arr.getvalue()
+
             print(f"📦 Compressed image size: {len(compressed_data)} bytes")
             return compressed_data
             
@@ -112,6 +113,27 @@ class ImageProcessor:
             print(f"❌ Error saving image file: {e}")
             return None
     
+    def overlay_heatmap(self, image_data, heatmap, alpha=0.4):
+        """Blend a [0, 1] heatmap (jet colormap) over the image, return PNG bytes"""
+        image = Image.open(io.BytesIO(image_data)).convert('RGB')
+
+        heat = Image.fromarray(np.uint8(np.clip(heatmap, 0, 1) * 255), mode='L')
+        heat = np.asarray(heat.resize(image.size, Image.Resampling.BILINEAR), dtype=np.float32) / 255.0
+
+        # Jet colormap: blue -> cyan -> yellow -> red
+        colored = np.stack([
+            np.clip(1.5 - np.abs(4 * heat - 3), 0, 1),
+            np.clip(1.5 - np.abs(4 * heat - 2), 0, 1),
+            np.clip(1.5 - np.abs(4 * heat - 1), 0, 1),
+        ], axis=-1)
+
+        base = np.asarray(image, dtype=np.float32) / 255.0
+        blended = (1 - alpha) * base + alpha * colored
+
+        output = io.BytesIO()
+        Image.fromarray(np.uint8(blended * 255)).save(output, format='PNG', optimize=True)
+        return output.getvalue()
+
     def get_image_url(self, prediction_id):
         """Get image URL for display"""
         # Look for any file that matches the pattern
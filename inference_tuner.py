@@ -0,0 +1,191 @@
+"""CPU inference auto-tuner.
+
+Sweeps TensorFlow intra-/inter-op thread pool sizes, concurrent worker
+processes and batch sizes against the real AlzheimerModel on this host,
+prints the throughput/latency frontier and writes the best configuration
+to the inference profile that model_loader applies at startup.
+
+    python inference_tuner.py --workers 1,2,4 --intra 1,2,4 --inter 1,2 --batch 1,8,32
+"""
+import argparse
+import itertools
+import json
+import os
+import subprocess
+import sys
+import time
+
+PROFILE_PATH = os.environ.get(
+    "INFERENCE_PROFILE", os.path.join(os.getcwd(), "models", "inference_profile.json")
+)
+
+
+def load_profile(path=None):
+    """Return the tuned profile, with TF_*_THREADS env vars taking precedence"""
+    profile = {}
+    path = path or PROFILE_PATH
+    if os.path.exists(path):
+        try:
+            with open(path) as f:
+                profile = json.load(f).get("best", {})
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Ignoring unreadable inference profile {path}: {e}")
+
+    for key, env in (("intra_op_threads", "TF_INTRA_OP_THREADS"),
+                     ("inter_op_threads", "TF_INTER_OP_THREADS"),
+                     ("batch_size", "INFERENCE_BATCH_SIZE")):
+        if os.environ.get(env):
+            profile[key] = int(os.environ[env])
+    return profile
+
+
+def apply_profile(profile):
+    """Configure TF thread pools. Must run before TensorFlow executes any op."""
+    import tensorflow as tf
+
+    if not profile:
+        return
+    try:
+        if profile.get("intra_op_threads"):
+            tf.config.threading.set_intra_op_parallelism_threads(profile["intra_op_threads"])
+        if profile.get("inter_op_threads"):
+            tf.config.threading.set_inter_op_parallelism_threads(profile["inter_op_threads"])
+        print(f"⚙️ Inference profile applied: intra={profile.get('intra_op_threads')} "
+              f"inter={profile.get('inter_op_threads')} batch={profile.get('batch_size')}")
+    except RuntimeError as e:
+        print(f"⚠️ Inference profile not applied (TensorFlow already initialized): {e}")
+
+
+def run_child(batch_size, duration, start_at):
+    """Benchmark one worker process; prints a JSON result line"""
+    import numpy as np
+    from model_loader import model_predictor
+
+    if model_predictor.model is None:
+        model_predictor.load_model()
+    model = model_predictor.model
+    batch = np.random.rand(batch_size, 128, 128, 3).astype(np.float32)
+    model.predict(batch, verbose=0)  # warm up at this batch size
+
+    # Start all workers of a configuration together so they actually contend
+    time.sleep(max(0.0, start_at - time.time()))
+
+    latencies = []
+    images = 0
+    begin = time.perf_counter()
+    while time.perf_counter() - begin < duration:
+        t0 = time.perf_counter()
+        model(batch, training=False)
+        latencies.append(time.perf_counter() - t0)
+        images += batch_size
+    elapsed = time.perf_counter() - begin
+    print(json.dumps({"images": images, "elapsed": elapsed, "latencies": latencies}))
+
+
+def measure(intra, inter, workers, batch_size, duration):
+    env = dict(os.environ, TF_INTRA_OP_THREADS=str(intra), TF_INTER_OP_THREADS=str(inter),
+               TF_CPP_MIN_LOG_LEVEL="3")
+    start_at = time.time() + 15  # leave time for every worker to import TF and load the model
+    procs = [
+        subprocess.Popen([sys.executable, __file__, "--child", "--batch", str(batch_size),
+                          "--duration", str(duration), "--start-at", str(start_at)],
+                         env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        for _ in range(workers)
+    ]
+
+    images, wall, latencies = 0, 0.0, []
+    for proc in procs:
+        out, _ = proc.communicate()
+        lines = [line for line in out.splitlines() if line.startswith("{")]
+        if proc.returncode != 0 or not lines:
+            raise RuntimeError(f"Tuning worker failed (intra={intra}, inter={inter}, batch={batch_size})")
+        result = json.loads(lines[-1])
+        images += result["images"]
+        wall = max(wall, result["elapsed"])
+        latencies.extend(result["latencies"])
+
+    latencies.sort()
+    return {
+        "intra_op_threads": intra,
+        "inter_op_threads": inter,
+        "workers": workers,
+        "batch_size": batch_size,
+        "throughput": round(images / wall, 2),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p95_ms": round(latencies[max(0, int(len(latencies) * 0.95) - 1)] * 1000, 2),
+    }
+
+
+def pareto_frontier(results):
+    """Configurations not beaten on both throughput and p95 latency"""
+    frontier = []
+    for r in results:
+        dominated = any(
+            o["throughput"] >= r["throughput"] and o["p95_ms"] <= r["p95_ms"]
+            and (o["throughput"] > r["throughput"] or o["p95_ms"] < r["p95_ms"])
+            for o in results
+        )
+        if not dominated:
+            frontier.append(r)
+    return sorted(frontier, key=lambda r: r["p95_ms"])
+
+
+def int_list(value):
+    return [int(v) for v in value.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    cores = os.cpu_count() or 1
+    parser.add_argument("--intra", type=int_list, default=sorted({1, 2, max(1, cores // 2), cores}))
+    parser.add_argument("--inter", type=int_list, default=[1, 2])
+    parser.add_argument("--workers", type=int_list, default=sorted({1, 2, max(1, cores // 2)}))
+    parser.add_argument("--batch", type=int_list, default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds measured per configuration")
+    parser.add_argument("--max-latency-ms", type=float, default=500.0,
+                        help="p95 batch latency budget for picking the best configuration")
+    parser.add_argument("--output", default=PROFILE_PATH)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--start-at", type=float, default=0.0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.batch[0], args.duration, args.start_at)
+        return
+
+    results = []
+    for intra, inter, workers, batch_size in itertools.product(args.intra, args.inter, args.workers, args.batch):
+        # Skip configurations that oversubscribe the host outright
+        if intra * workers > cores * 2:
+            continue
+        print(f"🔬 intra={intra} inter={inter} workers={workers} batch={batch_size} ...", flush=True)
+        try:
+            results.append(measure(intra, inter, workers, batch_size, args.duration))
+        except RuntimeError as e:
+            print(f"❌ {e}")
+
+    if not results:
+        print("❌ No configuration could be measured")
+        sys.exit(1)
+
+    frontier = pareto_frontier(results)
+    within_budget = [r for r in results if r["p95_ms"] <= args.max_latency_ms] or frontier
+    best = max(within_budget, key=lambda r: r["throughput"])
+
+    print(f"\n📊 Throughput/latency frontier on {cores} cores:")
+    print(f"   {'intra':>5} {'inter':>5} {'workers':>7} {'batch':>5} {'img/s':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for r in frontier:
+        marker = "  ⭐ best" if r is best else ""
+        print(f"   {r['intra_op_threads']:>5} {r['inter_op_threads']:>5} {r['workers']:>7} {r['batch_size']:>5} "
+              f"{r['throughput']:>9.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f}{marker}")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump({"host_cores": cores, "tuned_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                   "max_latency_ms": args.max_latency_ms, "best": best,
+                   "frontier": frontier, "results": results}, f, indent=2)
+    print(f"✅ Profile written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import json
+import os
+import queue
+import threading
+import time
+import traceback
+import uuid
+
+TERMINAL_STATES = ('done', 'failed')
+
+class JobQueueFull(Exception):
+    """Raised when the local job queue can't take more work"""
+
+class Job:
+    def __init__(self, owner_id, kind):
+        self.id = uuid.uuid4().hex
+        self.owner_id = owner_id
+        self.kind = kind
+        self.state = 'queued'
+        self.stages = []
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        # Bumped on every change so SSE streams can wait for "something new"
+        self.version = 0
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'state': self.state,
+            'stages': self.stages,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+        }
+
+class JobManager:
+    """In-process job queue with worker threads and progress tracking.
+
+    Jobs are retained after they finish so clients can still poll them,
+    and are evicted job_ttl seconds after their last update.
+    """
+
+    def __init__(self, workers=None, max_queue=None, job_ttl=None):
+        self.workers = workers or int(os.environ.get('JOB_WORKERS', 2))
+        self.job_ttl = job_ttl or float(os.environ.get('JOB_TTL_SECONDS', 600))
+        self._queue = queue.Queue(maxsize=max_queue or int(os.environ.get('JOB_MAX_QUEUE', 100)))
+        self._jobs = {}
+        self._cond = threading.Condition()
+        self._threads = []
+
+    def _ensure_workers(self):
+        # Started lazily so importing the module (e.g. for CLI commands) spawns nothing
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f'job-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, owner_id, kind, fn, *args, **kwargs):
+        """Queue fn(progress, *args, **kwargs); its return value becomes the job result"""
+        self._evict_expired()
+        job = Job(owner_id, kind)
+        with self._cond:
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait((job, fn, args, kwargs))
+        except queue.Full:
+            with self._cond:
+                self._jobs.pop(job.id, None)
+            raise JobQueueFull("Job queue is full")
+        with self._cond:
+            self._cond.notify_all()
+        self._ensure_workers()
+        return job
+
+    def pending(self):
+        """Jobs queued or still running"""
+        return self._queue.unfinished_tasks
+
+    def get(self, job_id, owner_id=None):
+        self._evict_expired()
+        job = self._jobs.get(job_id)
+        if job is None or (owner_id is not None and job.owner_id != owner_id):
+            return None
+        return job
+
+    def _update(self, job, state=None, stage=None, info=None, result=None, error=None):
+        with self._cond:
+            if state:
+                job.state = state
+            if stage:
+                job.stages.append({'stage': stage, 'at': time.time(), **(info or {})})
+            if result is not None:
+                job.result = result
+            if error is not None:
+                job.error = error
+            job.updated_at = time.time()
+            job.version += 1
+            self._cond.notify_all()
+
+    def _worker(self):
+        while True:
+            job, fn, args, kwargs = self._queue.get()
+            self._update(job, state='running', stage='started')
+            progress = lambda stage, **info: self._update(job, stage=stage, info=info)
+            try:
+                result = fn(progress, *args, **kwargs)
+                self._update(job, state='done', stage='finished', result=result)
+            except Exception as e:
+                print(f"❌ Job {job.id} failed: {e}")
+                traceback.print_exc()
+                self._update(job, state='failed', stage='failed', error=str(e))
+            finally:
+                self._queue.task_done()
+
+    def _evict_expired(self):
+        cutoff = time.time() - self.job_ttl
+        with self._cond:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job.state in TERMINAL_STATES and job.updated_at < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    def stream(self, job, heartbeat=15.0):
+        """Server-Sent Events for a job: one 'progress' event per change,
+        a final 'done'/'failed' event, and comment heartbeats in between"""
+        seen = -1
+        while True:
+            with self._cond:
+                if job.version == seen:
+                    self._cond.wait_for(lambda: job.version != seen, timeout=heartbeat)
+                changed = job.version != seen
+                seen = job.version
+                snapshot = job.to_dict()
+
+            if not changed:
+                yield ": keep-alive\n\n"
+                continue
+
+            event = snapshot['state'] if snapshot['state'] in TERMINAL_STATES else 'progress'
+            yield f"event: {event}\ndata: {json.dumps(snapshot)}\n\n"
+            if event != 'progress':
+                return
+
+# Initialize job manager
+job_manager = JobManager()
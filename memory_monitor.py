@@ -0,0 +1,214 @@
+import os
+import signal
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from admission import AdmissionRejected
+
+try:
+    import psutil
+except ImportError:  # Falls back to /proc on Linux
+    psutil = None
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+def rss_bytes():
+    """Current resident set size of this process, or None if unknown"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def peak_rss_bytes():
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+# tracemalloc's own bookkeeping and import machinery aren't interesting allocation sites
+TRACE_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+]
+
+class MemoryMonitor:
+    """Per-request memory accounting and an RSS budget guard.
+
+    Every tracked request records its RSS growth. When tracemalloc is on,
+    one request at a time is also sampled for its peak Python/numpy
+    allocation (tracemalloc's peak is process-wide, so a concurrent
+    request can inflate a sample). Native TensorFlow allocations only
+    show up in RSS.
+
+    When RSS passes the budget the worker starts draining: new tracked
+    requests are shed with 503 + Retry-After, and once in-flight requests
+    and queued jobs reach zero the process signals itself (SIGTERM by
+    default) so gunicorn or another supervisor starts a fresh worker.
+    """
+
+    def __init__(self, rss_budget_mb=None, trace_frames=None, dump_dir=None):
+        self.rss_budget = int(rss_budget_mb or os.environ.get('MEMORY_RSS_BUDGET_MB', 0)) * 1024 * 1024
+        self.dump_dir = dump_dir or os.environ.get('MEMORY_DUMP_DIR', os.path.join('cache', 'memory'))
+        self.recycle_signal = getattr(signal, os.environ.get('MEMORY_RECYCLE_SIGNAL', 'SIGTERM'))
+        self.draining = False
+        self._inflight = 0
+        self._lock = threading.Lock()
+        self._sample_lock = threading.Lock()
+        self._drain_checks = []
+        self._baseline = None
+        self.endpoints = {}
+
+        frames = int(trace_frames or os.environ.get('MEMORY_TRACEMALLOC_FRAMES', 0))
+        if frames:
+            self.start_tracing(frames)
+
+    def start_tracing(self, frames=10):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            print(f"🧠 tracemalloc started ({frames} frames)")
+        self._baseline = tracemalloc.take_snapshot().filter_traces(TRACE_FILTERS)
+
+    def stop_tracing(self):
+        tracemalloc.stop()
+        self._baseline = None
+        print("🧠 tracemalloc stopped")
+
+    def add_drain_check(self, pending):
+        """pending() -> amount of outstanding work (e.g. queued jobs) that must finish before recycling"""
+        self._drain_checks.append(pending)
+
+    def begin(self, endpoint, admit=True):
+        """Start tracking a request. With admit=True a draining worker
+        raises AdmissionRejected instead. Returns a token for end()"""
+        with self._lock:
+            if admit and self.draining:
+                raise AdmissionRejected('memory_drain', 5)
+            self._inflight += 1
+        sampled = tracemalloc.is_tracing() and self._sample_lock.acquire(blocking=False)
+        traced_before = 0
+        if sampled:
+            tracemalloc.reset_peak()
+            traced_before = tracemalloc.get_traced_memory()[0]
+        return (endpoint, rss_bytes(), sampled, traced_before)
+
+    def end(self, token):
+        endpoint, rss_before, sampled, traced_before = token
+        peak_alloc = None
+        if sampled:
+            peak_alloc = max(0, tracemalloc.get_traced_memory()[1] - traced_before)
+            self._sample_lock.release()
+        rss_after = rss_bytes()
+
+        with self._lock:
+            self._inflight -= 1
+            stats = self.endpoints.setdefault(endpoint, {
+                'requests': 0, 'rss_growth_bytes': 0, 'max_rss_growth_bytes': 0,
+                'sampled': 0, 'peak_alloc_bytes_sum': 0, 'peak_alloc_bytes_max': 0,
+            })
+            stats['requests'] += 1
+            if rss_before is not None and rss_after is not None:
+                growth = rss_after - rss_before
+                stats['rss_growth_bytes'] += growth
+                stats['max_rss_growth_bytes'] = max(stats['max_rss_growth_bytes'], growth)
+            if peak_alloc is not None:
+                stats['sampled'] += 1
+                stats['peak_alloc_bytes_sum'] += peak_alloc
+                stats['peak_alloc_bytes_max'] = max(stats['peak_alloc_bytes_max'], peak_alloc)
+
+            if self.rss_budget and rss_after and rss_after > self.rss_budget and not self.draining:
+                self.draining = True
+                print(f"🧠 RSS {rss_after / 2**20:.0f} MB over budget "
+                      f"{self.rss_budget / 2**20:.0f} MB; draining worker {os.getpid()}")
+                threading.Thread(target=self._recycle_when_idle, name='memory-drain', daemon=True).start()
+
+    @contextmanager
+    def track(self, endpoint, admit=True):
+        """with memory_monitor.track('job'): run the work"""
+        token = self.begin(endpoint, admit)
+        try:
+            yield
+        finally:
+            self.end(token)
+
+    def _idle(self):
+        with self._lock:
+            inflight = self._inflight
+        return inflight == 0 and not any(pending() for pending in self._drain_checks)
+
+    def _recycle_when_idle(self):
+        # Sleeping before each check also lets the last response flush
+        while True:
+            time.sleep(1.0)
+            if self._idle():
+                break
+        if tracemalloc.is_tracing():
+            self.dump_profile()
+        print(f"♻️ Recycling worker {os.getpid()} (RSS {(rss_bytes() or 0) / 2**20:.0f} MB)")
+        os.kill(os.getpid(), self.recycle_signal)
+
+    def top_sites(self, limit=10):
+        """Largest live allocation sites, and the sites that grew most since tracing started"""
+        if not tracemalloc.is_tracing():
+            return None, None
+        snapshot = tracemalloc.take_snapshot().filter_traces(TRACE_FILTERS)
+        site = lambda stat: f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}"
+        top = [{'site': site(stat), 'size_bytes': stat.size, 'count': stat.count}
+               for stat in snapshot.statistics('lineno')[:limit]]
+        growth = None
+        if self._baseline is not None:
+            growth = [{'site': site(stat), 'size_diff_bytes': stat.size_diff, 'count_diff': stat.count_diff}
+                      for stat in snapshot.compare_to(self._baseline, 'lineno')[:limit]]
+        return top, growth
+
+    def dump_profile(self):
+        """Write a tracemalloc snapshot (load with tracemalloc.Snapshot.load); returns its path"""
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc is not running")
+        os.makedirs(self.dump_dir, exist_ok=True)
+        path = os.path.join(self.dump_dir, f"profile-{os.getpid()}-{int(time.time())}.tracemalloc")
+        tracemalloc.take_snapshot().dump(path)
+        print(f"🧠 tracemalloc profile written to {path}")
+        return path
+
+    def report(self, limit=10):
+        top, growth = self.top_sites(limit)
+        traced, traced_peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (None, None)
+        with self._lock:
+            endpoints = {name: dict(stats) for name, stats in self.endpoints.items()}
+            inflight = self._inflight
+        return {
+            'pid': os.getpid(),
+            'rss_bytes': rss_bytes(),
+            'peak_rss_bytes': peak_rss_bytes(),
+            'rss_budget_bytes': self.rss_budget or None,
+            'draining': self.draining,
+            'inflight': inflight,
+            'endpoints': endpoints,
+            'tracemalloc': {
+                'tracing': tracemalloc.is_tracing(),
+                'traced_bytes': traced,
+                'traced_peak_bytes': traced_peak,
+                'top_sites': top,
+                'growth_since_start': growth,
+            },
+        }
+
+    def prometheus_metrics(self):
+        lines = []
+        rss = rss_bytes()
+        if rss is not None:
+            lines += ['# TYPE process_resident_memory_bytes gauge', f"process_resident_memory_bytes {rss}"]
+        lines += ['# TYPE worker_memory_draining gauge', f"worker_memory_draining {int(self.draining)}"]
+        return "\n".join(lines) + "\n"
+
+# Initialize memory monitor
+memory_monitor = MemoryMonitor()
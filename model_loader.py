@@ -2,14 +2,141 @@ import tensorflow as tf
 import numpy as np
 from PIL import Image
 import os
+import re
+import threading
+import time
+from inference_tuner import load_profile, apply_profile
+
+# Versioned model registry: models/registry/<version>/<model file>
+# An optional models/registry/CURRENT file pins the version to serve,
+# otherwise the highest version (natural order: v2 < v10) wins.
+# Every worker watches CURRENT, so rewriting it rolls a version out to all of them.
+MODEL_REGISTRY_DIR = os.environ.get(
+    "MODEL_REGISTRY_DIR", os.path.join(os.getcwd(), "models", "registry")
+)
+MODEL_PIN_FILE = os.path.join(MODEL_REGISTRY_DIR, "CURRENT")
+MODEL_PIN_CHECK_SECONDS = float(os.environ.get("MODEL_PIN_CHECK_SECONDS", 5))
+MODEL_EXTENSIONS = (".h5", ".keras")
+
+def version_sort_key(name):
+    """Natural order for version names, so v2 < v10 and 1.2.9 < 1.2.10"""
+    return [(1, int(part), "") if part.isdigit() else (0, 0, part.lower())
+            for part in re.split(r"(\d+)", name) if part]
+
+# Thread pools have to be sized before TensorFlow runs its first op
+inference_profile = load_profile()
+apply_profile(inference_profile)
+
 
 class AlzheimerModel:
     def __init__(self):
         """Initialize with empty model and fixed class order"""
-        self.model = None
+        # (model, version) pair - swapped as a whole so a request never
+        # sees a new model with an old version label or vice versa
+        self._active = (None, None)
+        self._swap_lock = threading.Lock()
+        self._reload_thread = None
+        self._grad_model = (None, None)
+        self._embed_model = (None, None)
+        # Batch size picked by inference_tuner.py for batched inference paths
+        self.batch_size = inference_profile.get("batch_size", 32)
+        self.reload_status = {"state": "idle", "version": None, "error": None}
+        # (mtime, pinned version) of CURRENT as last acted on, and when it was last checked
+        self._pin_seen = None
+        self._pin_checked_at = 0.0
         # ✅ Correct order based on dataset folder naming
         self.classes = ["MildDemented", "ModerateDemented", "NonDemented", "VeryMildDemented"]
 
+    @property
+    def model(self):
+        return self._active[0]
+
+    @property
+    def version(self):
+        return self._active[1]
+
+    def active(self):
+        """The (model, version) pair in use right now, read as one unit"""
+        return self._active
+
+    def list_versions(self):
+        """List model versions available in the registry"""
+        if not os.path.isdir(MODEL_REGISTRY_DIR):
+            return []
+        versions = []
+        for name in sorted(os.listdir(MODEL_REGISTRY_DIR), key=version_sort_key):
+            if self._find_artifact(os.path.join(MODEL_REGISTRY_DIR, name)):
+                versions.append(name)
+        return versions
+
+    def _find_artifact(self, version_dir):
+        """Return the model file inside a registry version directory"""
+        if not os.path.isdir(version_dir):
+            return None
+        for file in sorted(os.listdir(version_dir)):
+            if file.endswith(MODEL_EXTENSIONS):
+                return os.path.join(version_dir, file)
+        return None
+
+    def read_pin(self):
+        """Version named in registry/CURRENT, or None"""
+        try:
+            with open(MODEL_PIN_FILE) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def pin_version(self, version):
+        """Point registry/CURRENT at a version. Every worker's check_pin()
+        then loads it, so this is how a version is rolled out"""
+        if version not in self.list_versions():
+            raise FileNotFoundError(f"Model version '{version}' not found in {MODEL_REGISTRY_DIR}")
+        tmp_path = f"{MODEL_PIN_FILE}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(version + "\n")
+        os.replace(tmp_path, MODEL_PIN_FILE)
+
+    def check_pin(self, force=False):
+        """Hot-swap to the pinned version if CURRENT changed since we last
+        looked. Cheap enough to call per request: stats the file at most
+        every MODEL_PIN_CHECK_SECONDS"""
+        now = time.monotonic()
+        if not force and now - self._pin_checked_at < MODEL_PIN_CHECK_SECONDS:
+            return
+        self._pin_checked_at = now
+        try:
+            mtime = os.path.getmtime(MODEL_PIN_FILE)
+        except OSError:
+            return
+        pinned = self.read_pin()
+        if (mtime, pinned) == self._pin_seen:
+            return
+        # Acted on once per pin change, so a version that fails to load isn't retried in a loop
+        if pinned is None or pinned == self.version or self.reload_async(pinned):
+            self._pin_seen = (mtime, pinned)
+            if pinned is not None and pinned != self.version:
+                print(f"📌 Model pin changed to {pinned}; reloading in worker {os.getpid()}")
+
+    def resolve_version(self, version=None):
+        """Pick the version to load: explicit, pinned in CURRENT, or latest"""
+        if version is None:
+            version = self.read_pin()
+
+        if version is not None:
+            # Only registry entries: never join arbitrary input into a path
+            if version not in self.list_versions():
+                raise FileNotFoundError(f"Model version '{version}' not found in {MODEL_REGISTRY_DIR}")
+            return self._find_artifact(os.path.join(MODEL_REGISTRY_DIR, version)), version
+
+        versions = self.list_versions()
+        if versions:
+            version = versions[-1]
+            return self._find_artifact(os.path.join(MODEL_REGISTRY_DIR, version)), version
+
+        # No registry yet - fall back to the legacy single-file layout
+        path = self.find_model_file()
+        return path, os.path.splitext(os.path.basename(path))[0]
+
     def find_model_file(self):
         """Find model file automatically inside /models directory"""
         model_dir = os.path.join(os.getcwd(), "models")
@@ -27,60 +154,194 @@ class AlzheimerModel:
         print(f"❌ No model file found in {model_dir}")
         raise FileNotFoundError("No .h5 model file found! Please add it inside the 'models' folder.")
 
-    def load_model(self, model_path=None):
+    def _load_and_warm(self, model_path):
+        """Load a model from disk and run one dummy batch so the first real
+        request does not pay graph tracing cost"""
+        model = tf.keras.models.load_model(model_path, compile=False)
+        model.predict(np.zeros((1, 128, 128, 3), dtype=np.float32), verbose=0)
+        return model
+
+    def load_model(self, model_path=None, version=None):
         """Load the trained CNN model"""
         if model_path is None:
-            model_path = self.find_model_file()
+            model_path, version = self.resolve_version(version)
+        elif version is None:
+            version = os.path.splitext(os.path.basename(model_path))[0]
 
         try:
-            print(f"🔄 Loading model from: {model_path}")
-            self.model = tf.keras.models.load_model(model_path, compile=False)
-            print("✅ Model loaded successfully!")
+            print(f"🔄 Loading model {version} from: {model_path}")
+            model = self._load_and_warm(model_path)
+            with self._swap_lock:
+                self._active = (model, version)
+            print(f"✅ Model {version} loaded successfully!")
         except Exception as e:
             print(f"❌ Error loading model: {e}")
             raise e
 
-    def preprocess_image(self, image_file):
-        """Resize & normalize MRI image to match training size (128x128x3)"""
+    def reload_async(self, version=None):
+        """Load (and warm up) a model version in the background, then swap it
+        in atomically. Requests already running keep the model they started with."""
+        with self._swap_lock:
+            if self._reload_thread is not None and self._reload_thread.is_alive():
+                return False
+            self.reload_status = {"state": "loading", "version": version, "error": None,
+                                  "started_at": time.time()}
+            self._reload_thread = threading.Thread(
+                target=self._reload_worker, args=(version,), daemon=True
+            )
+            self._reload_thread.start()
+        return True
+
+    def _reload_worker(self, version):
+        try:
+            self.load_model(version=version)
+            self.reload_status = {"state": "ready", "version": self.version, "error": None,
+                                  "finished_at": time.time()}
+        except Exception as e:
+            self.reload_status = {"state": "failed", "version": version, "error": str(e),
+                                  "finished_at": time.time()}
+
+    def load_tensor(self, image_file):
+        """Decode & resize an MRI image to the training size as uint8 (128, 128, 3)"""
         try:
             img = Image.open(image_file).convert("RGB")
             img = img.resize((128, 128))  # ✅ matches your training image size
-            img_array = np.array(img, dtype=np.float32) / 255.0  # normalize to [0, 1]
-            img_array = np.expand_dims(img_array, axis=0)  # shape: (1, 128, 128, 3)
-            return img_array
+            return np.asarray(img, dtype=np.uint8)
         except Exception as e:
             print(f"❌ Error during image preprocessing: {e}")
             raise e
 
+    def preprocess_image(self, image_file):
+        """Resize & normalize MRI image to match training size (128x128x3)"""
+        img_array = self.load_tensor(image_file).astype(np.float32) / 255.0  # normalize to [0, 1]
+        return np.expand_dims(img_array, axis=0)  # shape: (1, 128, 128, 3)
+
+    def _format_result(self, probabilities, version):
+        predicted_index = int(np.argmax(probabilities))
+        return {
+            "prediction": self.classes[predicted_index],
+            "confidence": round(float(probabilities[predicted_index]), 4),
+            "all_predictions": {
+                label: round(float(prob),4)
+                for label, prob in zip(self.classes, probabilities)
+            },
+            "model_version": version,
+        }
+
+    def predict_tensors(self, tensors, batch_size=None, active=None):
+        """Run a batch of uint8 (n, 128, 128, 3) tensors through the model.
+        Pass active=(model, version) from active() to keep several calls on
+        one model. Returns (results, embeddings, model_version)"""
+        if active is None:
+            if self.model is None:
+                self.load_model()
+            # Snapshot the active pair once; a concurrent hot-swap won't affect us
+            active = self._active
+
+        model, version = active
+        embed_model = self._get_embed_model(model, version)
+        batch_size = batch_size or self.batch_size
+
+        results, embeddings = [], []
+        for start in range(0, len(tensors), batch_size):
+            batch = np.asarray(tensors[start:start + batch_size], dtype=np.float32) / 255.0
+            # One forward pass yields both the penultimate-layer embedding and the probabilities
+            embedding, prediction = embed_model.predict_on_batch(batch)
+            results.extend(self._format_result(p, version) for p in prediction)
+            embeddings.append(embedding.reshape(len(batch), -1).astype(np.float32))
+
+        embeddings = np.concatenate(embeddings) if embeddings else np.empty((0, 0), dtype=np.float32)
+        return results, embeddings, version
+
     def predict(self, image_file):
         """Run prediction and return class + confidence"""
         if self.model is None:
             print("⚠️ Model not loaded yet — loading now...")
             self.load_model()
 
-        processed_img = self.preprocess_image(image_file)
+        tensor = self.load_tensor(image_file)
 
         try:
-            prediction = self.model.predict(processed_img, verbose=0)
-            predicted_index = np.argmax(prediction)
-            predicted_class = self.classes[predicted_index]
-            confidence = float(np.max(prediction))   # percentage
-
-            print(f"✅ Prediction: {predicted_class} ({confidence:.2f}%)")
-
-            return {
-                "prediction": predicted_class,
-                "confidence": round(confidence, 4),
-                "all_predictions": {
-                    label: round(float(prob),4)
-                    for label, prob in zip(self.classes, prediction[0])
-                },
-            }
+            results, embeddings, version = self.predict_tensors(tensor[np.newaxis])
+            result = results[0]
+
+            print(f"✅ Prediction: {result['prediction']} ({result['confidence']:.2f}%) [model {version}]")
+
+            result["embedding"] = embeddings[0]
+            # uint8 model input, kept so it can go to the tensor cache
+            result["input_tensor"] = tensor
+            return result
 
         except Exception as e:
             print(f"❌ Error during prediction: {e}")
             raise e
 
+    def _get_embed_model(self, model, version):
+        """Build (once per model version) a model that outputs the input of
+        the final classification layer alongside the class probabilities"""
+        cached_version, embed_model = self._embed_model
+        if embed_model is not None and cached_version == version:
+            return embed_model
+
+        embed_model = tf.keras.models.Model(model.inputs, [model.layers[-1].input, model.output])
+        self._embed_model = (version, embed_model)
+        return embed_model
+
+    def _get_grad_model(self, model, version):
+        """Build (once per model version) a model that outputs the last conv
+        feature map alongside the class probabilities"""
+        cached_version, grad_model = self._grad_model
+        if grad_model is not None and cached_version == version:
+            return grad_model
+
+        conv_layer = None
+        for layer in reversed(model.layers):
+            if isinstance(layer, tf.keras.layers.Conv2D):
+                conv_layer = layer
+                break
+        if conv_layer is None:
+            raise ValueError("Model has no Conv2D layer to compute Grad-CAM from")
+
+        grad_model = tf.keras.models.Model(model.inputs, [conv_layer.output, model.output])
+        self._grad_model = (version, grad_model)
+        return grad_model
+
+    def grad_cam(self, image_file, class_index=None, active=None):
+        """Compute a Grad-CAM heatmap in [0, 1] for the predicted (or given) class.
+        Pass active=(model, version) from active() to pin the model the
+        caller keyed its cache on. Returns (heatmap, class_name, model_version)"""
+        if active is None:
+            if self.model is None:
+                self.load_model()
+            active = self._active
+
+        processed_img = self.preprocess_image(image_file)
+        model, version = active
+        grad_model = self._get_grad_model(model, version)
+
+        try:
+            inputs = tf.convert_to_tensor(processed_img)
+            with tf.GradientTape() as tape:
+                conv_output, predictions = grad_model(inputs, training=False)
+                if class_index is None:
+                    class_index = int(tf.argmax(predictions[0]))
+                class_score = predictions[:, class_index]
+
+            grads = tape.gradient(class_score, conv_output)
+            # Channel weights = global-average-pooled gradients
+            weights = tf.reduce_mean(grads, axis=(0, 1, 2))
+            heatmap = tf.reduce_sum(conv_output[0] * weights, axis=-1)
+            heatmap = tf.nn.relu(heatmap).numpy()
+
+            peak = heatmap.max()
+            if peak > 0:
+                heatmap = heatmap / peak
+            return heatmap.astype(np.float32), self.classes[class_index], version
+
+        except Exception as e:
+            print(f"❌ Error computing Grad-CAM: {e}")
+            raise e
+
 
 # 🌟 Create global instance for reuse
 model_predictor = AlzheimerModel()
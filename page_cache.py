@@ -0,0 +1,87 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+
+
+def template_fingerprint(template_dir=TEMPLATE_DIR):
+    """Hash of every template's name and content. Workers running the same
+    templates agree on it, so an ETag issued by one is honoured by all;
+    editing a template invalidates the ETags issued before it."""
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(template_dir):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            digest.update(os.path.relpath(path, template_dir).encode() + b'\0')
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+TEMPLATE_FINGERPRINT = template_fingerprint()
+
+class PageCache:
+    """In-memory LRU of rendered per-user pages (history, dashboard).
+
+    Each entry is tagged with the ETag it was rendered for. The ETag folds
+    in the user's history_version, so any saved or re-scored prediction
+    turns the next lookup into a miss without explicit invalidation.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None):
+        self.max_entries = max_entries or int(os.environ.get('PAGE_CACHE_MAX_ENTRIES', 1024))
+        self.max_bytes = max_bytes or int(os.environ.get('PAGE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'not_modified': 0, 'evictions': 0}
+
+    def etag(self, page, user_id, version, *extra):
+        raw = ":".join(str(part) for part in (TEMPLATE_FINGERPRINT, page, user_id, version, *extra))
+        return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+    def record_not_modified(self):
+        with self._lock:
+            self.stats['not_modified'] += 1
+
+    def get_or_render(self, page, user_id, etag, render):
+        """Return the cached HTML for (page, user) if it was rendered for
+        this etag, otherwise call render() and keep the result"""
+        key = (page, user_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] == etag:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return entry[1]
+            self.stats['misses'] += 1
+
+        html = render()
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old:
+                self._bytes -= len(old[1])
+            self._entries[key] = (etag, html)
+            self._bytes += len(html)
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.stats['evictions'] += 1
+        return html
+
+    def summary(self):
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return {
+                **self.stats,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hit_rate': round(self.stats['hits'] / lookups, 3) if lookups else None,
+            }
+
+# Initialize page cache
+page_cache = PageCache()
@@ -0,0 +1,112 @@
+import io
+import json
+import time
+import numpy as np
+
+def _decode_from_blob(db, model, prediction):
+    """Slow path: decrypt the stored JPEG and decode/resize it again"""
+    image_data = db.get_image_blob(prediction['id'])
+    if not image_data:
+        return None
+    return model.load_tensor(io.BytesIO(image_data))
+
+
+def rescore_predictions(db, model, tensor_cache, embedding_index=None, page_size=1024, limit=None):
+    """Re-run every stored prediction through the active model version.
+
+    Inputs are streamed from the memory-mapped tensor cache; predictions
+    missing from it fall back to decrypt-and-decode once and are added to
+    the cache. Each page is written back in one transaction tagged with
+    the new model version, so an interrupted job resumes where it stopped
+    simply by running it again.
+    """
+    if model.model is None:
+        model.load_model()
+    version = model.version
+    print(f"🔁 Re-scoring predictions with model {version}")
+
+    stats = {'rescored': 0, 'cache_hits': 0, 'decoded': 0, 'missing': 0,
+             'cache_load_s': 0.0, 'decode_s': 0.0, 'inference_s': 0.0, 'write_s': 0.0}
+    started = time.perf_counter()
+    after_id = 0
+
+    while limit is None or stats['rescored'] < limit:
+        page = db.get_predictions_to_rescore(version, after_id, page_size)
+        if not page:
+            break
+        if limit is not None:
+            page = page[:limit - stats['rescored']]
+        after_id = page[-1]['id']
+
+        t0 = time.perf_counter()
+        batch, found = tensor_cache.get_many([p['image_hash'] for p in page])
+        stats['cache_load_s'] += time.perf_counter() - t0
+        stats['cache_hits'] += int(found.sum())
+
+        keep = found.copy()
+        t0 = time.perf_counter()
+        for i in np.flatnonzero(~found):
+            tensor = _decode_from_blob(db, model, page[i])
+            if tensor is None:
+                stats['missing'] += 1
+                continue
+            batch[i] = tensor
+            keep[i] = True
+            if page[i]['image_hash']:
+                tensor_cache.put(page[i]['image_hash'], tensor)
+            stats['decoded'] += 1
+        stats['decode_s'] += time.perf_counter() - t0
+
+        page = [p for p, k in zip(page, keep) if k]
+        if not page:
+            continue
+        batch = batch[keep]
+
+        t0 = time.perf_counter()
+        results, embeddings, batch_version = model.predict_tensors(batch)
+        stats['inference_s'] += time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        updates = [
+            (json.dumps({"prediction": r["prediction"], "confidence": r["confidence"],
+                         "details": r["all_predictions"]}), r["confidence"], version, p['id'])
+            for p, r in zip(page, results)
+        ]
+        if not db.update_prediction_results(updates):
+            print(f"❌ Write failed for ids up to {after_id}; rerun to resume")
+            break
+        if embedding_index is not None:
+            embedding_index.add_many([p['id'] for p in page], [p['user_id'] for p in page], embeddings, batch_version)
+        stats['write_s'] += time.perf_counter() - t0
+
+        stats['rescored'] += len(page)
+        elapsed = time.perf_counter() - started
+        print(f"📈 {stats['rescored']} re-scored ({stats['rescored'] / elapsed:.1f} images/s), up to id {after_id}")
+
+    stats['elapsed_s'] = time.perf_counter() - started
+    return stats
+
+
+def compare_input_paths(db, model, tensor_cache, sample=256):
+    """images/sec of loading model inputs from the memmap vs decrypt-and-decode,
+    measured on predictions still waiting to be re-scored"""
+    if model.model is None:
+        model.load_model()
+    pending = db.get_predictions_to_rescore(model.version, 0, sample * 4)
+    page = [p for p in pending if p['image_hash'] in tensor_cache][:sample]
+    if not page:
+        return None
+
+    t0 = time.perf_counter()
+    tensor_cache.get_many([p['image_hash'] for p in page])
+    memmap_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    decoded = sum(_decode_from_blob(db, model, p) is not None for p in page)
+    decode_s = time.perf_counter() - t0
+
+    return {
+        'images': len(page),
+        'memmap_images_per_s': round(len(page) / max(memmap_s, 1e-9), 1),
+        'decode_images_per_s': round(decoded / max(decode_s, 1e-9), 1),
+    }
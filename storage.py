@@ -0,0 +1,759 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import traceback
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from image_utils import image_processor, hash_password
+
+try:
+    import mysql.connector
+    from mysql.connector import Error as MySQLError
+except ImportError:  # SQLite-only deployments don't need the MySQL driver
+    mysql = None
+    MySQLError = None
+
+# Columns of the predictions table served to history pages - never the image payload
+PREDICTION_COLUMNS = (
+    "id, user_id, image_path, prediction_result, confidence, image_hash, "
+    "model_version, prediction_date"
+)
+
+# Every write to a user's history bumps their counter, which keys page ETags and the page cache
+BUMP_HISTORY_VERSION = "UPDATE users SET history_version = history_version + 1 WHERE id = %s"
+
+
+class Storage:
+    """Storage interface shared by every backend.
+
+    Users, predictions, history and images are all handled here in
+    backend-neutral SQL (``%s`` placeholders). Backends implement the
+    connection handling (``execute_query``, ``execute_transaction``,
+    ``is_available``, ``check_database_exists``) and the few dialect
+    differences below.
+    """
+
+    name = None
+    # SQL returning the id generated by the previous INSERT on the connection
+    last_insert_id_sql = None
+    # INSERT variant that skips rows whose primary key already exists
+    insert_ignore_sql = None
+
+    def execute_query(self, query, params=None, fetch=True):
+        raise NotImplementedError
+
+    def execute_transaction(self, statements):
+        raise NotImplementedError
+
+    def transaction(self):
+        """Context manager yielding execute(query, params) inside one
+        transaction; execute returns fetched rows for SELECTs, else lastrowid"""
+        raise NotImplementedError
+
+    def is_available(self):
+        raise NotImplementedError
+
+    def check_database_exists(self):
+        raise NotImplementedError
+
+    def migrate_image_blobs(self, batch_size=500, pause=0.05):
+        raise NotImplementedError
+
+    def authenticate_user_by_username_or_email(self, username_or_email, password):
+        """Improved authentication with better error handling"""
+        query = "SELECT * FROM users WHERE (username = %s OR email = %s) AND password = %s"
+        params = (username_or_email, username_or_email, hash_password(password))
+        
+        result = self.execute_query(query, params)
+        
+        if result and len(result) > 0:
+            user = result[0]
+            print(f"✅ User {user['username']} authenticated successfully!")
+            return user
+        else:
+            print(f"❌ Authentication failed for {username_or_email}")
+            return None
+    
+    def check_user_exists(self, username, email):
+        """Check if user exists"""
+        query = "SELECT id FROM users WHERE username = %s OR email = %s"
+        params = (username, email)
+        
+        result = self.execute_query(query, params)
+        return result is not None and len(result) > 0
+    
+    def register_user(self, user_data):
+        """Register user with transaction"""
+        query = '''
+            INSERT INTO users (username, email, birth_year, gender, blood_group, address, password, register_date)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        '''
+        params = (
+            user_data['username'],
+            user_data['email'],
+            user_data['birth_year'],
+            user_data['gender'],
+            user_data['blood_group'],
+            user_data['address'],
+            hash_password(user_data['password']),
+            datetime.now()
+        )
+        
+        result = self.execute_query(query, params, fetch=False)
+        if result:
+            print(f"✅ User {user_data['username']} registered successfully!")
+            return True
+        else:
+            print(f"❌ Registration failed for {user_data['username']}")
+            return False
+    
+    def save_prediction(self, user_id, image_file, prediction_result, confidence, prediction_details, model_version=None,
+                        source='image'):
+        """Save prediction to database with image encryption - IMPROVED VERSION.
+        source is 'image' or 'volume' (a whole-volume result stored with one slice).
+        Returns (prediction_id, image_hash), or (None, None) if only the file could be saved"""
+        try:
+            print("💾 Starting prediction save process...")
+            
+            # Reset file pointer before reading
+            image_file.seek(0)
+            
+            # Read original image data
+            original_image_data = image_file.read()
+            print(f"📄 Original file size: {len(original_image_data)} bytes")
+            
+            # Reset again for compression
+            image_file.seek(0)
+            
+            # Compress image (pass the bytes so compress_image doesn't read another copy)
+            compressed_image = image_processor.compress_image(original_image_data)
+
+            if not compressed_image:
+                print("❌ No compressed image data")
+                compressed_image = original_image_data
+            # The upload can be several MB; don't hold it for the rest of the save
+            del original_image_data
+
+            print(f"📦 Final compressed size: {len(compressed_image)} bytes")
+            
+            # Generate encryption key and encrypt
+            encryption_key = image_processor.generate_key()
+            encrypted_image = image_processor.encrypt_image(compressed_image, encryption_key)
+            
+            # Generate hash
+            image_hash = image_processor.generate_hash(compressed_image)
+            
+            # Save to file system for easy access
+            filename = f"prediction_{int(time.time())}_{user_id}.jpg"
+            filepath = image_processor.save_image_file(compressed_image, filename)
+            
+            if not filepath:
+                print("❌ Failed to save image file, using fallback filename")
+                filename = f"prediction_{int(time.time())}_{user_id}.jpg"
+            
+            # Check database connection first
+            if not self.is_available():
+                print("❌ Database not available, saving to file system only")
+                return None, None  # Image is on the file system, but there is no row
+            
+            # Store as JSON string
+            result_with_details = json.dumps({
+                "prediction": prediction_result,
+                "confidence": confidence,
+                "details": prediction_details
+            })
+            
+            prediction_id = self.insert_prediction(
+                user_id, filename, result_with_details, confidence, image_hash,
+                model_version, encrypted_image, encryption_key.decode(), source=source
+            )
+            if prediction_id:
+                print(f"✅ Prediction {prediction_id} saved for user {user_id}")
+                return prediction_id, image_hash
+            else:
+                print(f"❌ Error saving prediction for user {user_id}")
+                return None, None
+                
+        except Exception as e:
+            print(f"❌ Error in save_prediction: {e}")
+            traceback.print_exc()
+            
+            # Fallback: try to save just the file
+            try:
+                image_file.seek(0)
+                original_data = image_file.read()
+                filename = f"prediction_fallback_{int(time.time())}_{user_id}.jpg"
+                image_processor.save_image_file(original_data, filename)
+                print("✅ Saved image file as fallback")
+                return None, None
+            except Exception as fallback_error:
+                print(f"❌ Fallback save failed: {fallback_error}")
+                return None, None
+    
+    def insert_prediction(self, user_id, image_path, prediction_result, confidence, image_hash,
+                          model_version, encrypted_image, encryption_key, prediction_date=None, source='image'):
+        """Insert the metadata row and its image blob in one transaction.
+        They go to separate tables so history queries never drag the blob
+        pages through the buffer pool. Returns the new prediction id."""
+        query = '''
+            INSERT INTO predictions (user_id, image_path, prediction_result, confidence, 
+                                     image_hash, model_version, source, prediction_date)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        '''
+        image_query = f'''
+            INSERT INTO prediction_images (prediction_id, image_data, encryption_key)
+            VALUES ({self.last_insert_id_sql}, %s, %s)
+        '''
+        params = (
+            user_id,
+            image_path,
+            prediction_result,
+            float(confidence),
+            image_hash,
+            model_version,
+            source,
+            prediction_date or datetime.now()
+        )
+        row_ids = self.execute_transaction([
+            (query, params),
+            (image_query, (encrypted_image, encryption_key)),
+            (BUMP_HISTORY_VERSION, (user_id,)),
+        ])
+        return row_ids[0] if row_ids else None
+
+    def _prepare_image(self, user_id, image_data, index):
+        """Compress, store on disk, hash and encrypt one uploaded image"""
+        compressed_image = image_processor.compress_image(image_data) or image_data
+        # Unique per upload: save_predictions maps ids back through these names
+        filename = f"prediction_{int(time.time())}_{index}_{uuid.uuid4().hex[:8]}_{user_id}.jpg"
+        image_processor.save_image_file(compressed_image, filename)
+        encryption_key = image_processor.generate_key()
+        return {
+            'image_path': filename,
+            'image_hash': image_processor.generate_hash(compressed_image),
+            'encrypted_image': image_processor.encrypt_image(compressed_image, encryption_key),
+            'encryption_key': encryption_key.decode(),
+        }
+
+    def save_predictions(self, user_id, items, model_version=None, executor=None):
+        """Save many (image bytes, prediction result) pairs with one multi-row
+        INSERT per table, all in a single transaction.
+        Returns [(prediction_id, image_hash), ...] in input order, or None"""
+        if not items:
+            return []
+        prepare = lambda pair: self._prepare_image(user_id, pair[1][0], pair[0])
+        mapper = executor.map if executor else map
+        prepared = list(mapper(prepare, enumerate(items)))
+        now = datetime.now()
+
+        meta_rows, meta_params = [], []
+        for (_, result), image in zip(items, prepared):
+            meta_rows.append("(%s, %s, %s, %s, %s, %s, %s)")
+            meta_params += [
+                user_id,
+                image['image_path'],
+                json.dumps({
+                    "prediction": result["prediction"],
+                    "confidence": result["confidence"],
+                    "details": result["all_predictions"]
+                }),
+                float(result["confidence"]),
+                image['image_hash'],
+                model_version,
+                now,
+            ]
+        paths = [image['image_path'] for image in prepared]
+
+        try:
+            with self.transaction() as execute:
+                execute(f'''
+                    INSERT INTO predictions (user_id, image_path, prediction_result, confidence,
+                                             image_hash, model_version, prediction_date)
+                    VALUES {", ".join(meta_rows)}
+                ''', tuple(meta_params))
+
+                # Auto-increment ids of a multi-row insert aren't guaranteed
+                # contiguous, so map them back through the unique file names
+                rows = execute(
+                    f"SELECT id, image_path FROM predictions WHERE user_id = %s "
+                    f"AND image_path IN ({', '.join(['%s'] * len(paths))})",
+                    (user_id, *paths)
+                )
+                ids = {row['image_path']: row['id'] for row in rows}
+
+                image_params = []
+                for image in prepared:
+                    image_params += [ids[image['image_path']], image['encrypted_image'], image['encryption_key']]
+                execute(f'''
+                    INSERT INTO prediction_images (prediction_id, image_data, encryption_key)
+                    VALUES {", ".join(["(%s, %s, %s)"] * len(prepared))}
+                ''', tuple(image_params))
+                execute(BUMP_HISTORY_VERSION, (user_id,))
+
+            print(f"✅ {len(prepared)} predictions saved for user {user_id}")
+            return [(ids[image['image_path']], image['image_hash']) for image in prepared]
+
+        except Exception as e:
+            print(f"❌ Error in save_predictions: {e}")
+            traceback.print_exc()
+            return None
+
+    def get_user_predictions(self, user_id):
+        """Get user predictions"""
+        query = f"SELECT {PREDICTION_COLUMNS} FROM predictions WHERE user_id = %s ORDER BY prediction_date DESC"
+        result = self.execute_query(query, (user_id,))
+        
+        if result:
+            for prediction in result:
+                try:
+                    result_data = json.loads(prediction['prediction_result'])
+                    prediction['parsed_result'] = result_data
+                except:
+                    prediction['parsed_result'] = {
+                        'prediction': prediction['prediction_result'],
+                        'confidence': prediction['confidence']
+                    }
+        
+        return result or []
+
+    def get_prediction(self, prediction_id, user_id):
+        """Get a single prediction's metadata (no image payload)"""
+        query = f"SELECT {PREDICTION_COLUMNS} FROM predictions WHERE id = %s AND user_id = %s"
+        result = self.execute_query(query, (prediction_id, user_id))
+        return result[0] if result else None
+
+    def get_predictions_by_ids(self, prediction_ids):
+        """Get metadata for several predictions at once, keyed by id"""
+        if not prediction_ids:
+            return {}
+        placeholders = ", ".join(["%s"] * len(prediction_ids))
+        query = f"SELECT {PREDICTION_COLUMNS} FROM predictions WHERE id IN ({placeholders})"
+        result = self.execute_query(query, tuple(prediction_ids)) or []
+        for prediction in result:
+            try:
+                prediction['parsed_result'] = json.loads(prediction['prediction_result'])
+            except (TypeError, ValueError):
+                prediction['parsed_result'] = {
+                    'prediction': prediction['prediction_result'],
+                    'confidence': prediction['confidence']
+                }
+        return {prediction['id']: prediction for prediction in result}
+
+    def get_predictions_to_rescore(self, model_version, after_id=0, limit=1000):
+        """Next page (by id) of predictions not yet scored by model_version.
+        Volume rows are skipped: their stored slice can't reproduce the
+        multi-slice aggregate"""
+        query = '''
+            SELECT id, user_id, image_hash FROM predictions
+            WHERE id > %s AND source = 'image' AND (model_version IS NULL OR model_version <> %s)
+            ORDER BY id LIMIT %s
+        '''
+        return self.execute_query(query, (after_id, model_version, limit)) or []
+
+    def update_prediction_results(self, updates):
+        """Bulk-update (prediction_result, confidence, model_version, id) rows in one transaction"""
+        if not updates:
+            return True
+        query = "UPDATE predictions SET prediction_result = %s, confidence = %s, model_version = %s WHERE id = %s"
+        ids = [params[3] for params in updates]
+        bump_owners = f'''
+            UPDATE users SET history_version = history_version + 1
+            WHERE id IN (SELECT user_id FROM predictions WHERE id IN ({", ".join(["%s"] * len(ids))}))
+        '''
+        statements = [(query, params) for params in updates] + [(bump_owners, tuple(ids))]
+        return bool(self.execute_transaction(statements))
+
+    def get_history_version(self, user_id):
+        """Current history counter for a user, or None if it can't be read"""
+        result = self.execute_query("SELECT history_version FROM users WHERE id = %s", (user_id,))
+        return result[0]['history_version'] if result else None
+
+    def get_image_blob(self, prediction_id):
+        """Fetch and decrypt the stored image for a prediction. Only the
+        image-serving routes should call this."""
+        result = self._fetch_image_row(prediction_id)
+
+        if not result or not result[0]['image_data'] or not result[0]['encryption_key']:
+            return None
+
+        try:
+            key = result[0]['encryption_key'].encode()
+            return image_processor.decrypt_image(result[0]['image_data'], key)
+        except Exception as decrypt_error:
+            print(f"❌ Decryption failed: {decrypt_error}")
+            return None
+
+    def _fetch_image_row(self, prediction_id):
+        query = "SELECT image_data, encryption_key FROM prediction_images WHERE prediction_id = %s"
+        return self.execute_query(query, (prediction_id,))
+
+    def get_prediction_image(self, prediction_id, user_id):
+        """Return (prediction row, image bytes) for a user's prediction"""
+        prediction = self.get_prediction(prediction_id, user_id)
+        if not prediction:
+            return None, None
+
+        if prediction.get('image_path'):
+            filepath = os.path.join('static/uploads', prediction['image_path'])
+            if os.path.exists(filepath) and os.path.getsize(filepath) > 0:
+                with open(filepath, 'rb') as f:
+                    return prediction, f.read()
+
+        return prediction, self.get_image_blob(prediction_id)
+
+
+class MySQLStorage(Storage):
+    """MySQL backend (XAMPP defaults, overridable via MYSQL_* env vars)"""
+
+    name = 'mysql'
+    last_insert_id_sql = 'LAST_INSERT_ID()'
+    insert_ignore_sql = 'INSERT IGNORE'
+
+    def __init__(self):
+        if mysql is None:
+            raise RuntimeError("mysql-connector-python is not installed; set STORAGE_BACKEND=sqlite")
+        self.host = os.environ.get('MYSQL_HOST', 'localhost')
+        self.user = os.environ.get('MYSQL_USER', 'root')
+        self.password = os.environ.get('MYSQL_PASSWORD', '')  # XAMPP default is empty
+        self.database = os.environ.get('MYSQL_DATABASE', 'alzheimer_app')
+    
+    def get_connection(self, retries=3, delay=2):
+        """Create connection with retry logic"""
+        for attempt in range(retries):
+            try:
+                connection = mysql.connector.connect(
+                    host=self.host,
+                    user=self.user,
+                    password=self.password,
+                    database=self.database,
+                    auth_plugin='mysql_native_password',
+                    connection_timeout=30
+                )
+                
+                if connection.is_connected():
+                    print(f"✅ Database connection established (attempt {attempt + 1})")
+                    return connection
+                    
+            except MySQLError as e:
+                print(f"❌ Connection attempt {attempt + 1} failed: {e}")
+                if attempt < retries - 1:
+                    print(f"🔄 Retrying in {delay} seconds...")
+                    time.sleep(delay)
+                else:
+                    print("❌ All connection attempts failed")
+                    return None
+        
+        return None
+    
+    def execute_query(self, query, params=None, fetch=True):
+        """Execute query with proper connection handling"""
+        connection = None
+        cursor = None
+        
+        try:
+            connection = self.get_connection()
+            if not connection:
+                return None
+            
+            # Using prepared=True to handle binary data (BLOB) correctly
+            cursor = connection.cursor(prepared=True, dictionary=True) 
+            cursor.execute(query, params or ())
+            
+            if fetch:
+                result = cursor.fetchall()
+                return result
+            else:
+                connection.commit()
+                return True
+                
+        except MySQLError as e:
+            print(f"❌ Query execution failed: {e}")
+            if connection:
+                connection.rollback()
+            return None
+        finally:
+            if cursor:
+                cursor.close()
+            if connection and connection.is_connected():
+                connection.close()
+    
+    def execute_transaction(self, statements):
+        """Run several (query, params) statements in one transaction.
+        Returns the lastrowid of each statement, or False on failure"""
+        connection = None
+        cursor = None
+        
+        try:
+            connection = self.get_connection()
+            if not connection:
+                return False
+            
+            cursor = connection.cursor(prepared=True)
+            row_ids = []
+            for query, params in statements:
+                cursor.execute(query, params or ())
+                row_ids.append(cursor.lastrowid)
+            connection.commit()
+            return row_ids
+                
+        except MySQLError as e:
+            print(f"❌ Transaction failed: {e}")
+            if connection:
+                connection.rollback()
+            return False
+        finally:
+            if cursor:
+                cursor.close()
+            if connection and connection.is_connected():
+                connection.close()
+    
+    @contextmanager
+    def transaction(self):
+        connection = self.get_connection()
+        if not connection:
+            raise RuntimeError("Database not available")
+        cursor = connection.cursor(prepared=True, dictionary=True)
+
+        def execute(query, params=None):
+            cursor.execute(query, params or ())
+            return cursor.fetchall() if cursor.with_rows else cursor.lastrowid
+
+        try:
+            yield execute
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
+            connection.close()
+    
+    def check_database_exists(self):
+        """Check if database and tables exist"""
+        try:
+            # First check if we can connect to MySQL
+            test_conn = mysql.connector.connect(
+                host=self.host,
+                user=self.user,
+                password=self.password,
+                auth_plugin='mysql_native_password'
+            )
+            test_conn.close()
+            
+            # Now check if our database exists and contains the 'users' table
+            connection = self.get_connection()
+            if not connection:
+                return False
+                
+            cursor = connection.cursor()
+            cursor.execute("""
+                SELECT COUNT(*) FROM information_schema.tables 
+                WHERE table_schema = %s AND table_name = 'users'
+            """, (self.database,))
+            users_table_exists = cursor.fetchone()[0] > 0
+            cursor.close()
+            connection.close()
+            
+            return users_table_exists
+                
+        except MySQLError as e:
+            print(f"❌ Error checking database: {e}")
+            return False
+    
+    def is_available(self):
+        connection = self.get_connection()
+        if not connection:
+            return False
+        connection.close()
+        return True
+
+    def _fetch_image_row(self, prediction_id):
+        result = super()._fetch_image_row(prediction_id)
+        if not result:
+            # Rows not yet moved by `flask migrate-images` still hold the blob inline
+            query = "SELECT image_data, encryption_key FROM predictions WHERE id = %s AND image_data IS NOT NULL"
+            result = self.execute_query(query, (prediction_id,))
+        return result
+
+    def migrate_image_blobs(self, batch_size=500, pause=0.05):
+        """Move inline predictions.image_data into prediction_images in
+        small id-range batches, each its own short transaction, so the
+        table stays writable while the migration runs"""
+        result = self.execute_query("SELECT MAX(id) AS max_id FROM predictions")
+        max_id = result[0]['max_id'] if result and result[0]['max_id'] else 0
+        moved_batches = 0
+        last_id = 0
+
+        while last_id < max_id:
+            upper = last_id + batch_size
+            ok = self.execute_transaction([
+                (f'''
+                    {self.insert_ignore_sql} INTO prediction_images (prediction_id, image_data, encryption_key)
+                    SELECT id, image_data, encryption_key FROM predictions
+                    WHERE id > %s AND id <= %s AND image_data IS NOT NULL
+                ''', (last_id, upper)),
+                ('''
+                    UPDATE predictions SET image_data = NULL
+                    WHERE id > %s AND id <= %s AND image_data IS NOT NULL
+                ''', (last_id, upper)),
+            ])
+            if not ok:
+                print(f"❌ Migration stopped at id {last_id}; rerun to resume")
+                return False
+
+            moved_batches += 1
+            last_id = upper
+            print(f"📦 Migrated image blobs up to id {min(last_id, max_id)}/{max_id}")
+            time.sleep(pause)
+
+        print(f"✅ Image blob migration complete ({moved_batches} batches)")
+        return True
+
+
+# SQLite stores datetimes as ISO text; convert both ways explicitly
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_converter("TIMESTAMP", lambda value: datetime.fromisoformat(value.decode()))
+
+SQLITE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT UNIQUE NOT NULL,
+    email TEXT UNIQUE NOT NULL,
+    birth_year INTEGER NOT NULL,
+    gender TEXT NOT NULL CHECK (gender IN ('Male', 'Female', 'Other')),
+    blood_group TEXT NOT NULL,
+    address TEXT NOT NULL,
+    password TEXT NOT NULL,
+    register_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    history_version INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS predictions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER REFERENCES users(id),
+    image_path TEXT,
+    prediction_result TEXT,
+    confidence REAL,
+    image_hash TEXT,
+    model_version TEXT,
+    source TEXT NOT NULL DEFAULT 'image',
+    prediction_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS prediction_images (
+    prediction_id INTEGER PRIMARY KEY REFERENCES predictions(id) ON DELETE CASCADE,
+    image_data BLOB NOT NULL,
+    encryption_key TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_predictions_user_date ON predictions (user_id, prediction_date);
+CREATE INDEX IF NOT EXISTS idx_predictions_image_hash ON predictions (image_hash);
+'''
+
+
+class SQLiteStorage(Storage):
+    """Embedded single-file backend for single-node deployments and benchmarks"""
+
+    name = 'sqlite'
+    last_insert_id_sql = 'last_insert_rowid()'
+    insert_ignore_sql = 'INSERT OR IGNORE'
+
+    def __init__(self, path=None):
+        self.path = path or os.environ.get('SQLITE_PATH', 'alzheimer_app.db')
+        # sqlite3 connections can't be shared across threads; keep one per thread
+        self._local = threading.local()
+        connection = self.get_connection()
+        connection.executescript(SQLITE_SCHEMA)
+        # Database files created before users.history_version existed
+        columns = [row['name'] for row in connection.execute("PRAGMA table_info(users)")]
+        if 'history_version' not in columns:
+            connection.execute("ALTER TABLE users ADD COLUMN history_version INTEGER NOT NULL DEFAULT 0")
+        # ... and before predictions.source
+        columns = [row['name'] for row in connection.execute("PRAGMA table_info(predictions)")]
+        if 'source' not in columns:
+            connection.execute("ALTER TABLE predictions ADD COLUMN source TEXT NOT NULL DEFAULT 'image'")
+        connection.commit()
+
+    def get_connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self.path,
+                detect_types=sqlite3.PARSE_DECLTYPES,
+                timeout=30,
+                cached_statements=256,  # prepared statement cache
+            )
+            connection.row_factory = sqlite3.Row
+            # WAL lets readers proceed while a prediction is being written
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("PRAGMA foreign_keys=ON")
+            self._local.connection = connection
+        return connection
+
+    def execute_query(self, query, params=None, fetch=True):
+        """Execute query on this thread's connection"""
+        connection = self.get_connection()
+        try:
+            cursor = connection.execute(query.replace('%s', '?'), params or ())
+            if fetch:
+                return [dict(row) for row in cursor.fetchall()]
+            connection.commit()
+            return True
+        except sqlite3.Error as e:
+            print(f"❌ Query execution failed: {e}")
+            connection.rollback()
+            return None
+
+    def execute_transaction(self, statements):
+        """Run several (query, params) statements in one transaction.
+        Returns the lastrowid of each statement, or False on failure"""
+        connection = self.get_connection()
+        try:
+            row_ids = []
+            with connection:
+                for query, params in statements:
+                    row_ids.append(connection.execute(query.replace('%s', '?'), params or ()).lastrowid)
+            return row_ids
+        except sqlite3.Error as e:
+            print(f"❌ Transaction failed: {e}")
+            return False
+
+    @contextmanager
+    def transaction(self):
+        connection = self.get_connection()
+
+        def execute(query, params=None):
+            cursor = connection.execute(query.replace('%s', '?'), params or ())
+            return [dict(row) for row in cursor.fetchall()] if cursor.description else cursor.lastrowid
+
+        with connection:
+            yield execute
+
+    def is_available(self):
+        return True
+
+    def check_database_exists(self):
+        """Schema is created on startup, so only check the file is usable"""
+        return self.execute_query("SELECT 1 FROM users LIMIT 1") is not None
+
+    def migrate_image_blobs(self, batch_size=500, pause=0.05):
+        print("✅ SQLite schema keeps images in prediction_images already; nothing to migrate")
+        return True
+
+
+STORAGE_BACKENDS = {
+    'mysql': MySQLStorage,
+    'sqlite': SQLiteStorage,
+}
+
+def create_storage(backend=None):
+    """Build the storage backend named by STORAGE_BACKEND (mysql or sqlite)"""
+    backend = (backend or os.environ.get('STORAGE_BACKEND', 'mysql')).lower()
+    if backend not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown STORAGE_BACKEND '{backend}' (expected one of {', '.join(STORAGE_BACKENDS)})")
+    print(f"🗄️ Using {backend} storage backend")
+    return STORAGE_BACKENDS[backend]()
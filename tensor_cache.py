@@ -0,0 +1,133 @@
+import os
+import threading
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process deployments only
+    fcntl = None
+
+TENSOR_SHAPE = (128, 128, 3)
+HASH_BYTES = 64  # sha256 hex digest
+# One fixed-width record per entry: the hash and its tensor can never drift apart
+RECORD_DTYPE = np.dtype([('hash', f'S{HASH_BYTES}'), ('tensor', np.uint8, TENSOR_SHAPE)])
+RECORD_BYTES = RECORD_DTYPE.itemsize
+
+def _lock_file(f, exclusive):
+    if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+def _unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_UN)
+
+class TensorCache:
+    """Preprocessed model inputs (128x128x3 uint8) keyed by image_hash.
+
+    Entries live in one append-only file, entries.bin, of fixed-width
+    (hash, tensor) records read through np.memmap, so a re-score job can
+    stream them in large batches without touching the encrypted blobs.
+    Several processes (gunicorn workers, `flask rescore`) can share it:
+    appends take an exclusive flock and compute their row from the file
+    size, and each process picks up rows written by the others whenever
+    the file grows.
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir or os.environ.get('TENSOR_CACHE_DIR', os.path.join('cache', 'tensors'))
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.path = os.path.join(self.cache_dir, 'entries.bin')
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._size = 0  # records already read into _rows
+        self._memmap = None
+        with open(self.path, 'ab'):
+            pass
+        self._refresh()
+
+    def _read_new_rows(self, file_size):
+        """Index records [self._size, file_size // RECORD_BYTES). Caller holds a file lock"""
+        size = file_size // RECORD_BYTES
+        if size <= self._size:
+            return
+        # Only the hash column is touched: one small read per record
+        hashes = np.memmap(self.path, dtype=RECORD_DTYPE, mode='r', offset=self._size * RECORD_BYTES,
+                           shape=(size - self._size,))['hash']
+        for row, image_hash in enumerate(hashes, start=self._size):
+            self._rows.setdefault(image_hash.decode(), row)
+        self._size = size
+
+    def _refresh(self):
+        """Pick up records appended by other processes"""
+        if os.path.getsize(self.path) // RECORD_BYTES <= self._size:
+            return
+        with self._lock, open(self.path, 'rb') as f:
+            # Shared lock: never read a record another process is still writing
+            _lock_file(f, exclusive=False)
+            try:
+                self._read_new_rows(os.fstat(f.fileno()).st_size)
+            finally:
+                _unlock_file(f)
+
+    def __len__(self):
+        self._refresh()
+        return self._size
+
+    def __contains__(self, image_hash):
+        self._refresh()
+        return image_hash in self._rows
+
+    def put(self, image_hash, tensor):
+        """Append one uint8 tensor; no-op if the hash is already cached"""
+        record = np.zeros(1, dtype=RECORD_DTYPE)
+        record['hash'] = image_hash.encode()
+        record['tensor'] = np.asarray(tensor, dtype=np.uint8).reshape(TENSOR_SHAPE)
+        with self._lock, open(self.path, 'r+b') as f:
+            _lock_file(f, exclusive=True)
+            try:
+                file_size = os.fstat(f.fileno()).st_size
+                if file_size % RECORD_BYTES:
+                    # Torn record from a crashed writer
+                    file_size -= file_size % RECORD_BYTES
+                    f.truncate(file_size)
+                self._read_new_rows(file_size)
+                if image_hash in self._rows:
+                    return self._rows[image_hash]
+                row = file_size // RECORD_BYTES
+                f.seek(file_size)
+                f.write(record.tobytes())
+                f.flush()
+                self._rows[image_hash] = row
+                self._size = row + 1
+                return row
+            finally:
+                _unlock_file(f)
+
+    def row_of(self, image_hash):
+        self._refresh()
+        return self._rows.get(image_hash)
+
+    def array(self):
+        """Read-only memmap over every cached tensor, shape (n, 128, 128, 3)"""
+        self._refresh()
+        size = self._size
+        if size == 0:
+            return np.empty((0,) + TENSOR_SHAPE, dtype=np.uint8)
+        if self._memmap is None or len(self._memmap) != size:
+            self._memmap = np.memmap(self.path, dtype=RECORD_DTYPE, mode='r', shape=(size,))['tensor']
+        return self._memmap
+
+    def get_many(self, image_hashes):
+        """Gather tensors for several hashes in one fancy-indexed read.
+        Returns (batch, found_mask)."""
+        tensors = self.array()
+        rows = np.array([self._rows.get(h, -1) for h in image_hashes], dtype=np.int64)
+        # A row appended by another thread after array() isn't in this memmap yet
+        found = (rows >= 0) & (rows < len(tensors))
+        batch = np.empty((len(rows),) + TENSOR_SHAPE, dtype=np.uint8)
+        if found.any():
+            batch[found] = tensors[rows[found]]
+        return batch, found
+
+# Initialize tensor cache
+tensor_cache = TensorCache()
@@ -0,0 +1,296 @@
+import os
+import io
+import gzip
+import zipfile
+import tempfile
+import numpy as np
+from PIL import Image
+
+# Optional volume readers: only needed for /predict_volume
+try:
+    import nibabel as nib
+except ImportError:
+    nib = None
+
+try:
+    import pydicom
+except ImportError:
+    pydicom = None
+
+NIFTI_EXTENSIONS = ('.nii', '.nii.gz')
+# Zip members with these extensions, or none at all (common for DICOM exports), are
+# tried as slices; dcmread rejects anything that isn't actually DICOM
+DICOM_EXTENSIONS = ('.dcm', '.dicom', '.ima')
+# Cap on the unpacked size of one upload (decompressed NIfTI or all DICOM members)
+VOLUME_MAX_BYTES = int(os.environ.get('VOLUME_MAX_BYTES', 1024 * 1024 * 1024))
+
+class VolumeError(ValueError):
+    """Upload is not a readable MRI volume"""
+
+class MRIVolume:
+    """Lazily readable stack of axial slices.
+
+    Only headers are read on open: NIfTI data stays behind nibabel's
+    memory-mapped array proxy, and DICOM slices are read one file at a
+    time. read_slices() pulls in just the slices asked for.
+    """
+
+    def __init__(self, num_slices, read_slice, source, cleanup=None):
+        self.num_slices = num_slices
+        self._read_slice = read_slice
+        self.source = source
+        self._cleanup = cleanup
+
+    def read_slices(self, indices):
+        slices = [np.asarray(self._read_slice(i), dtype=np.float32) for i in indices]
+        if len({s.shape for s in slices}) > 1:
+            raise VolumeError("Volume slices have different dimensions")
+        return np.stack(slices)
+
+    def close(self):
+        if self._cleanup:
+            self._cleanup()
+            self._cleanup = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Display orientation the model was trained on: anterior at the top and the
+# patient's right on the image's left (radiological convention)
+OPPOSITE = {'L': 'R', 'R': 'L', 'A': 'P', 'P': 'A', 'S': 'I', 'I': 'S'}
+
+def _reorient_slice(pixels, row_code, col_code):
+    """Flip/transpose a 2-D axial slice to rows running anterior->posterior
+    and columns running right->left. row_code / col_code are the directions
+    (aff2axcodes letters) in which the row and column indices increase."""
+    if row_code in ('L', 'R') and col_code in ('A', 'P'):
+        pixels, row_code, col_code = pixels.T, col_code, row_code
+    if row_code not in ('A', 'P') or col_code not in ('L', 'R'):
+        return pixels  # Not a recognisable axial plane; leave as stored
+    if row_code == 'A':
+        pixels = pixels[::-1]
+    if col_code == 'R':
+        pixels = pixels[:, ::-1]
+    return pixels
+
+def _lps_code(cosine):
+    """aff2axcodes-style letter for a DICOM direction cosine (patient LPS axes)"""
+    axis = int(np.argmax(np.abs(cosine)))
+    return 'LPS'[axis] if cosine[axis] > 0 else OPPOSITE['LPS'[axis]]
+
+def _copy_limited(src, dst, budget):
+    """Stream src to dst; raise VolumeError once more than budget bytes were written.
+    Returns the bytes written"""
+    written = 0
+    while chunk := src.read(1 << 20):
+        written += len(chunk)
+        if written > budget:
+            raise VolumeError(f"Volume is larger than {VOLUME_MAX_BYTES // 2**20} MB uncompressed")
+        dst.write(chunk)
+    return written
+
+
+def _open_nifti(path):
+    if nib is None:
+        raise VolumeError("NIfTI support requires nibabel (pip install nibabel)")
+    img = nib.load(path, mmap=True)
+    if len(img.shape) < 3:
+        raise VolumeError("NIfTI file is not a 3-D volume")
+
+    # Slice along whichever voxel axis points superior/inferior, without
+    # reorienting (which would load the whole array)
+    codes = nib.aff2axcodes(img.affine)
+    axial = [a for a, code in enumerate(codes) if code in ('S', 'I')]
+    if not axial:
+        raise VolumeError("NIfTI volume has no superior/inferior axis")
+    axis = axial[0]
+    # Voxel axes left in each 2-D slice, in order: they become rows, then columns
+    row_code, col_code = [codes[a] for a in range(3) if a != axis]
+    proxy = img.dataobj
+
+    def read_slice(i):
+        index = [slice(None)] * len(img.shape)
+        index[axis] = i
+        for extra in range(3, len(img.shape)):
+            index[extra] = 0  # first volume of a 4-D series
+        return _reorient_slice(np.asarray(proxy[tuple(index)]), row_code, col_code)
+
+    return MRIVolume(img.shape[axis], read_slice, 'nifti')
+
+
+def _open_dicom_series(paths):
+    if pydicom is None:
+        raise VolumeError("DICOM support requires pydicom (pip install pydicom)")
+
+    headers = []
+    for path in paths:
+        try:
+            ds = pydicom.dcmread(path, stop_before_pixels=True)
+        except Exception:
+            continue  # skip DICOMDIR, thumbnails and other non-image files
+        if 'ImagePositionPatient' in ds:
+            position = float(ds.ImagePositionPatient[2])
+        else:
+            position = float(getattr(ds, 'InstanceNumber', len(headers)))
+        headers.append((position, path))
+
+    if not headers:
+        raise VolumeError("No DICOM slices found in upload")
+    ordered = [path for _, path in sorted(headers)]
+
+    def read_slice(i):
+        ds = pydicom.dcmread(ordered[i])
+        pixels = ds.pixel_array.astype(np.float32)
+        pixels = pixels * float(getattr(ds, 'RescaleSlope', 1)) + float(getattr(ds, 'RescaleIntercept', 0))
+        if 'ImageOrientationPatient' in ds:
+            # Direction cosines (patient LPS axes) along which columns, then rows, advance
+            cosines = np.asarray(ds.ImageOrientationPatient, dtype=np.float64).reshape(2, 3)
+            col_code, row_code = (_lps_code(cosine) for cosine in cosines)
+            pixels = _reorient_slice(pixels, row_code, col_code)
+        return pixels
+
+    return MRIVolume(len(ordered), read_slice, 'dicom')
+
+
+def open_volume(upload):
+    """Open an uploaded NIfTI file or zipped DICOM series.
+
+    The upload is streamed to a temporary directory first, so the volume
+    is never held in memory as a whole.
+    """
+    filename = (upload.filename or '').lower()
+    workdir = tempfile.TemporaryDirectory(prefix='mri_volume_')
+
+    try:
+        if filename.endswith(NIFTI_EXTENSIONS):
+            path = os.path.join(workdir.name, 'volume.nii')
+            if filename.endswith('.gz'):
+                # A gzip stream can't be memory-mapped: every strided slice read would
+                # re-inflate it. Decompress once and map the plain file instead.
+                gz_path = path + '.gz'
+                upload.save(gz_path)
+                try:
+                    with gzip.open(gz_path, 'rb') as src, open(path, 'wb') as dst:
+                        _copy_limited(src, dst, VOLUME_MAX_BYTES)
+                except (OSError, EOFError) as e:
+                    raise VolumeError(f"Could not decompress NIfTI upload: {e}")
+                os.remove(gz_path)
+            else:
+                upload.save(path)
+            volume = _open_nifti(path)
+        elif filename.endswith('.zip'):
+            archive_path = os.path.join(workdir.name, 'series.zip')
+            upload.save(archive_path)
+            paths = []
+            with zipfile.ZipFile(archive_path) as archive:
+                members = []
+                for member in archive.infolist():
+                    extension = os.path.splitext(os.path.basename(member.filename))[1].lower()
+                    if member.is_dir() or (extension and extension not in DICOM_EXTENSIONS):
+                        continue
+                    members.append(member)
+                if sum(member.file_size for member in members) > VOLUME_MAX_BYTES:
+                    raise VolumeError(f"DICOM series is larger than {VOLUME_MAX_BYTES // 2**20} MB uncompressed")
+
+                # Declared sizes can lie, so the budget is enforced on the bytes actually written too
+                budget = VOLUME_MAX_BYTES
+                for i, member in enumerate(members):
+                    target = os.path.join(workdir.name, f"slice_{i:05d}.dcm")
+                    with archive.open(member) as src, open(target, 'wb') as dst:
+                        budget -= _copy_limited(src, dst, budget)
+                    paths.append(target)
+            os.remove(archive_path)
+            volume = _open_dicom_series(paths)
+        else:
+            raise VolumeError("Upload a NIfTI volume (.nii/.nii.gz) or a zipped DICOM series (.zip)")
+    except Exception:
+        workdir.cleanup()
+        raise
+
+    volume._cleanup = workdir.cleanup
+    return volume
+
+
+def select_slices(num_slices, max_slices=32, central_fraction=0.6):
+    """Evenly spaced axial slice indices from the central part of the volume,
+    where the brain (and the hippocampal region) is"""
+    margin = int(num_slices * (1 - central_fraction) / 2)
+    start, stop = margin, max(margin + 1, num_slices - margin)
+    count = min(max_slices, stop - start)
+    return np.unique(np.linspace(start, stop - 1, count).round().astype(int))
+
+
+def normalize_slices(slices, size=(128, 128)):
+    """Robust per-slice intensity normalisation to uint8 (n, 128, 128, 3).
+    Percentile windowing is vectorised across the whole batch."""
+    low = np.percentile(slices, 1, axis=(1, 2), keepdims=True)
+    high = np.percentile(slices, 99, axis=(1, 2), keepdims=True)
+    scaled = np.clip((slices - low) / np.maximum(high - low, 1e-6), 0, 1)
+    scaled = (scaled * 255).astype(np.uint8)
+
+    resized = np.stack([
+        np.asarray(Image.fromarray(s).resize(size, Image.Resampling.BILINEAR)) for s in scaled
+    ])
+    return np.repeat(resized[..., np.newaxis], 3, axis=-1)
+
+
+def predict_volume(model, volume, max_slices=32, batch_size=None):
+    """Stream selected slices through the model batch by batch and
+    aggregate per-slice probabilities into one volume-level result.
+
+    Returns (result, representative_slice) where representative_slice is
+    the uint8 input of the most confident slice.
+    """
+    batch_size = batch_size or model.batch_size
+    indices = select_slices(volume.num_slices, max_slices)
+
+    slice_results = []
+    probabilities = []
+    best = (-1.0, None)
+    # Every batch must come from the same model, even if it is hot-swapped mid-volume
+    active = model.active()
+    version = active[1]
+    for start in range(0, len(indices), batch_size):
+        batch_indices = indices[start:start + batch_size]
+        tensors = normalize_slices(volume.read_slices(batch_indices))
+        results, _, _ = model.predict_tensors(tensors, active=active)
+
+        for index, tensor, result in zip(batch_indices, tensors, results):
+            probabilities.append([result['all_predictions'][label] for label in model.classes])
+            slice_results.append({
+                "slice_index": int(index),
+                "prediction": result['prediction'],
+                "confidence": result['confidence'],
+            })
+            if result['confidence'] > best[0]:
+                best = (result['confidence'], tensor)
+
+    mean_probabilities = np.mean(probabilities, axis=0)
+    predicted_index = int(np.argmax(mean_probabilities))
+    result = {
+        "prediction": model.classes[predicted_index],
+        "confidence": round(float(mean_probabilities[predicted_index]), 4),
+        "all_predictions": {
+            label: round(float(prob), 4) for label, prob in zip(model.classes, mean_probabilities)
+        },
+        "model_version": version,
+        "volume": {
+            "source": volume.source,
+            "total_slices": volume.num_slices,
+            "slices_scored": len(slice_results),
+            "slices": slice_results,
+        },
+    }
+    return result, best[1]
+
+
+def slice_to_png(tensor):
+    """Encode a uint8 slice tensor as PNG bytes for storage"""
+    output = io.BytesIO()
+    Image.fromarray(tensor).save(output, format='PNG')
+    output.seek(0)
+    return output